@@ -6,5 +6,22 @@ SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = True
 #PERMANENT_SESSION_LIFETIME = timedelta(minutes=10)
 
+# JSON response encoder, "orjson" or "json" (None for fastest installed)
+JSON_ENCODER = None
+# Pretty print every JSON response, otherwise only with ?pretty=1
+JSON_PRETTYPRINT = False
+
+# News database, set NEWS_DATABASE_URL env to use a database server
+DATABASE_FILE = "news_db.sqlite"
+SQLALCHEMY_ECHO = False
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Leave submit is under maintenance, keep it off until fixed
+LEAVE_SUBMIT_ENABLE = False
+
+# Course catalog (ag202) parser isn't checked against a real response
+# yet, keep its endpoints and crawl off until it is
+CATALOG_ENABLE = False
+
 UNITTEST_USERNAME = os.environ.get('USERNAME', '')
 UNITTEST_PASSWORD = os.environ.get('PASSWORD', '')
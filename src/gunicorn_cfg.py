@@ -14,8 +14,15 @@ worker_class = "sync"
 worker_connections = 1000
 timeout = 30
 keepalive = 5
+# Redis and database connect lazily per worker, so --preload is safe
 
 # Logger
 accesslog = "-"
 access_logformat = "[api.v2] %(h)s %(l)s %(u)s %(t)s .%(r)s. %(s)s %(b)s .%(f)s. .%(a)s. conn=\"%({Connection}i)s\""
 
+
+
+def post_fork(server, worker):
+    # Never share database connections opened before fork (--preload)
+    from kuas_api import news_db
+    news_db.get_engine(news_db.get_app()).dispose()
@@ -8,7 +8,6 @@ from flask import Flask
 import flask_admin as admin
 from flask_sqlalchemy import SQLAlchemy
 from flask_compress import Compress
-import os
 
 __version__ = "2.0"
 
@@ -19,17 +18,12 @@ app.config.from_object("config")
 admin = admin.Admin(app, name="KUAS-API News", template_mode="bootstrap3")
 
 # Add db
-app.config["DATABASE_FILE"] = "news_db.sqlite"
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + \
-    app.config["DATABASE_FILE"]
-app.config["SQLALCHEMY_ECHO"] = True
+import kuas_api.modules.database as database
+database.init_app(app)
 news_db = SQLAlchemy(app)
 
-# Let secret key go in
-import redis
-red = redis.StrictRedis.from_url(url= os.environ['REDIS_URL'],db=2)
-
-red.set("SECRET_KEY", str(app.config["SECRET_KEY"]))
+# Let secret key go in, same on every worker without asking redis
+secret_key = str(app.config["SECRET_KEY"]).encode("utf-8")
 
 
 # Compress please
@@ -1,27 +1,97 @@
 ﻿# -*- coding: utf-8 -*-
 
-import os
+import hmac
 import json
-import redis
+import time
 import hashlib
+import logging
+import uuid
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.contrib.cache import SimpleCache
 
+from kuas_api import secret_key
+# red_auth only use in cache.login, get decoded data from redis.
+from kuas_api.modules.redis_pool import red, red_auth
+
 import kuas_api.kuas.ap as ap
 import kuas_api.kuas.leave as leave
 import kuas_api.kuas.parse as parse
 import kuas_api.kuas.bus as bus
 import kuas_api.kuas.notification as notification
 import kuas_api.kuas.news as news
+import kuas_api.modules.credential as credential
 from lxml import etree
 
 AP_QUERY_EXPIRE = 3600
 BUS_EXPIRE_TIME = 0
 SERVER_STATUS_EXPIRE_TIME = 180
 NOTIFICATION_EXPIRE_TIME = 3600
+LEAVE_EXPIRE = 600
+
+#: Default and max semesters in score history
+SCORE_HISTORY_LIMIT = 10
+SCORE_HISTORY_MAX = 20
+#: Max ap queries at the same time for score history
+SCORE_HISTORY_WORKERS = 4
 
 BUS_QUERY_TAG = "bus"
 NOTIFICATION_TAG = "notification"
+NOTIFICATION_STORE_KEY = "notification_store"
+NOTIFICATION_SEEN_KEY = "notification_seen"
+NOTIFICATION_VERSION_KEY = "notification_version"
+NOTIFICATION_PAGE_SIZE_KEY = "notification_page_size"
+
+#: Max pages walked by one crawl, first crawl fill the store with these
+NOTIFICATION_CRAWL_MAX_PAGES = 30
+#: Max notifications kept in store
+NOTIFICATION_STORE_SIZE = 1000
+#: Max school pages fetched at the same time
+NOTIFICATION_FETCH_WORKERS = 4
+AP_QUERY_ETAG_TAG = ":etag"
+AP_QUERY_RENDERED_TAG = ":rendered"
+SCORE_HISTORY_TAG = "score_history"
+LEAVE_TAG = "leave:"
+LEAVE_INDEX_TAG = "leave_index:"
+LEAVE_FORM_STATE_TAG = "leave_form_state:"
+LEAVE_FORM_STATE_EXPIRE = 1200
+LEAVE_JOB_TAG = "leave_job:"
+LEAVE_JOB_QUEUE = "leave_job_queue"
+
+#: Seconds leave submit job status is kept
+LEAVE_JOB_EXPIRE = 3600
+SINGLE_FLIGHT_TAG = "single_flight:"
+
+#: Max seconds a single flight lock is held
+SINGLE_FLIGHT_EXPIRE = 30
+#: Max seconds waiting for other single flight finished
+SINGLE_FLIGHT_WAIT = 15
+SINGLE_FLIGHT_POLL_INTERVAL = 0.1
+
+ACTIVE_SESSIONS_KEY = "active_sessions"
+
+#: Only renew sessions of users active in this seconds
+ACTIVE_SESSION_WINDOW = 1800
+#: Renew school session older than this, school drop it after ~10 mins
+SESSION_RENEW_AGE = 420
+#: School session surely dead, renew it on request path
+SESSION_EXPIRE_AGE = 600
+#: Max sessions renewed at the same time, a pass must finish within
+#: SESSION_EXPIRE_AGE - SESSION_RENEW_AGE seconds
+SESSION_RENEW_WORKERS = 8
+
+CATALOG_KEY = "course_catalog"
+CATALOG_VERSION_KEY = "course_catalog_version"
+
+#: Max ag202 queries at the same time when crawling course catalog
+CATALOG_WORKERS = 4
+#: Weekdays (1 is Monday) and periods queried for course catalog
+CATALOG_WEEKDAYS = range(1, 8)
+CATALOG_PERIODS = range(1, 16)
+
+#: Systems login on first use
+SUBSYSTEM_LOGIN = {"bus": bus.login, "leave": leave.login}
 
 #: AP guest account
 AP_GUEST_ACCOUNT = "guest"
@@ -30,13 +100,9 @@ AP_GUEST_ACCOUNT = "guest"
 AP_GUEST_PASSWORD = "123"
 
 s_cache = SimpleCache()
-red = redis.StrictRedis.from_url(url=os.environ['REDIS_URL'], db=2)
-SECRET_KEY = red.get("SECRET_KEY") if red.exists(
-    "SECRET_KEY") else str(os.urandom(32))
-# Only use in cache.login , get encoded data from redis.
-# get data from redis should be able use without any decode or encode action.
-red_auth = redis.StrictRedis.from_url(
-    url=os.environ['REDIS_URL'], db=2, charset="utf-8", decode_responses=True)
+SECRET_KEY = secret_key
+
+logger = logging.getLogger(__name__)
 
 
 def dump_session_cookies(session, is_login):
@@ -54,12 +120,29 @@ def dump_session_cookies(session, is_login):
 
 
 def login(username, password):
+    """Login to AP only, bus and leave system will login on first use
+    (see :func:`subsystem_login`).
+
+    Without credential key password can't be stored, then login all
+    systems now, and the session won't be renewed.
+    """
     session = requests.Session()
-    is_login = {}
 
-    if red_auth.exists(username):
-        user_redis_cookies = red_auth.get(username)
-        return json.loads(user_redis_cookies)
+    # Reuse alive cookies only when password match the stored one.
+    # Otherwise ask school, wrong password fail there, and password
+    # changed at school replace the record.
+    user_redis_cookies = red_auth.get(username)
+    if user_redis_cookies:
+        user_cookies = json.loads(user_redis_cookies)
+        stored_password = credential.decrypt(user_cookies.get("credential"))
+
+        if stored_password is not None and hmac.compare_digest(
+                stored_password.encode("utf-8"),
+                str(password).encode("utf-8")):
+            return user_cookies
+
+    # None means not login yet
+    is_login = {"ap": False, "bus": None, "leave": None}
 
     # AP Login
     try:
@@ -67,52 +150,546 @@ def login(username, password):
     except:
         is_login["ap"] = False
 
-    # Login bus system
-    try:
-        bus.init(session)
-        is_login["bus"] = bus.login(session, username, password)
-    except:
-        is_login["bus"] = False
+    if not is_login["ap"]:
+        return False
+
+    if not credential.enabled():
+        for system, system_login in SUBSYSTEM_LOGIN.items():
+            try:
+                is_login[system] = system_login(session, username, password)
+            except:
+                is_login[system] = False
 
-    # Login leave system
-    try:
-        is_login["leave"] = leave.login(session, username, password)
-    except:
-        is_login["leave"] = False
-    if is_login["ap"]:
         return dump_session_cookies(session, is_login)
-    else:
-        return False
 
+    user_cookies = dump_session_cookies(session, is_login)
+    user_cookies["credential"] = credential.encrypt(password)
+    user_cookies["renewed_at"] = time.time()
 
-def ap_query(session, qid=None, args=None,
-             username=None, expire=AP_QUERY_EXPIRE):
+    return user_cookies
+
+
+def _single_flight(key, func,
+                   expire=SINGLE_FLIGHT_EXPIRE, wait=SINGLE_FLIGHT_WAIT):
+    """Only one worker run `func` for `key` at the same time,
+    others wait until it finished (or `wait` seconds).
+
+    :return: (True, func result) if run by us, (False, None) if waited
+    :rtype: tuple
+    """
+    lock_key = SINGLE_FLIGHT_TAG + key
+
+    if red.set(lock_key, 1, nx=True, ex=expire):
+        try:
+            return True, func()
+        finally:
+            red.delete(lock_key)
+
+    deadline = time.time() + wait
+    while red.exists(lock_key) and time.time() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+    return False, None
+
+
+def subsystem_login(session, username, system):
+    """Login to `system` (bus or leave) on first use, cookies of
+    `session` and user cookies in redis will be updated.
+
+    :param session: requests session restored with user cookies
+    :type session: requests.sessions.Session
+    :param username: school id
+    :type username: str
+    :param system: "bus" or "leave"
+    :type system: str
+    :return: login status of `system`
+    :rtype: bool
+    """
+    user_cookies = json.loads(red_auth.get(username))
+    if user_cookies["is_login"].get(system) is not None:
+        return user_cookies["is_login"][system]
+
+    def do_login():
+        password = credential.decrypt(user_cookies.get("credential"))
+
+        if password is None:
+            # Can't login without password, don't try again
+            is_login = stored = False
+        else:
+            try:
+                is_login = bool(
+                    SUBSYSTEM_LOGIN[system](session, username, password))
+            except:
+                is_login = False
+
+            # Maybe system is down for a while, try again on next request
+            stored = is_login or None
+
+        user_cookies["is_login"][system] = stored
+        new_cookies = dump_session_cookies(session, user_cookies["is_login"])
+        new_cookies["credential"] = user_cookies.get("credential")
+        new_cookies["renewed_at"] = user_cookies.get("renewed_at")
+
+        # Cookies just expired, don't bring them back without expire time
+        ttl = red_auth.ttl(username)
+        if ttl and ttl > 0:
+            red_auth.set(username, json.dumps(new_cookies), ex=ttl)
+
+        return is_login
+
+    done, is_login = _single_flight(
+        "login:%s:%s" % (system, username), do_login)
+    if done:
+        return is_login
+
+    # Other request just login for us, take its cookies
+    user_cookies = json.loads(red_auth.get(username))
+    for c in user_cookies["cookies"]:
+        session.cookies.set(c['name'], c['value'], domain=c['domain'])
+
+    return bool(user_cookies["is_login"].get(system))
+
+
+def touch_session(username):
+    """Mark user as active, only active users' sessions are renewed
+    in background (see :func:`renew_active_sessions`).
+    """
+    red.zadd(ACTIVE_SESSIONS_KEY, {username: time.time()})
+
+
+def session_need_renew(user_cookies, age=SESSION_RENEW_AGE):
+    """Check school session age of user cookies
+
+    :param user_cookies: user cookies record from redis
+    :type user_cookies: dict
+    :rtype: bool
+    """
+    renewed_at = user_cookies.get("renewed_at")
+
+    return renewed_at is not None and time.time() - renewed_at >= age
+
+
+def renew_session(username):
+    """Login again with stored credential, replace user cookies in redis
+    and keep its expire time. Token of user is still valid.
+
+    :param username: school id
+    :type username: str
+    :return: renew success or not
+    :rtype: bool
+    """
+    def do_renew():
+        user_cookies = red_auth.get(username)
+        if not user_cookies:
+            return False
+
+        user_cookies = json.loads(user_cookies)
+        password = credential.decrypt(user_cookies.get("credential"))
+        if password is None:
+            return False
+
+        session = requests.Session()
+        is_login = dict(user_cookies["is_login"])
+
+        try:
+            is_login["ap"] = ap.login(session, username, password)
+        except:
+            is_login["ap"] = False
+
+        # Keep old cookies, maybe school is down, try it next time
+        if not is_login["ap"]:
+            return False
+
+        # Only renew systems have been used
+        for system, system_login in SUBSYSTEM_LOGIN.items():
+            if not is_login.get(system):
+                continue
+
+            try:
+                is_login[system] = system_login(session, username, password)
+            except:
+                is_login[system] = None
+
+        new_cookies = dump_session_cookies(session, is_login)
+        new_cookies["credential"] = user_cookies["credential"]
+        new_cookies["renewed_at"] = time.time()
+
+        ttl = red_auth.ttl(username)
+        if not ttl or ttl <= 0:
+            return False
+        red_auth.set(username, json.dumps(new_cookies), ex=ttl)
+
+        return True
+
+    done, renewed = _single_flight("renew:" + username, do_renew)
+
+    return renewed if done else True
+
+
+def renew_active_sessions():
+    """Renew school sessions of active users before they expired,
+    :data:`SESSION_RENEW_WORKERS` sessions at the same time.
+
+    :return: count of renewed sessions
+    :rtype: int
+    """
+    now = time.time()
+    red.zremrangebyscore(ACTIVE_SESSIONS_KEY, 0, now - ACTIVE_SESSION_WINDOW)
+
+    usernames = [x.decode("utf-8")
+                 for x in red.zrange(ACTIVE_SESSIONS_KEY, 0, -1)]
+    if not usernames:
+        return 0
+
+    expired = []
+    due = []
+    for username, user_cookies in zip(usernames, red_auth.mget(usernames)):
+        if not user_cookies:
+            expired.append(username)
+        elif session_need_renew(json.loads(user_cookies)):
+            due.append(username)
+
+    if expired:
+        red.zrem(ACTIVE_SESSIONS_KEY, *expired)
+    if not due:
+        return 0
+
+    with ThreadPoolExecutor(
+            max_workers=min(len(due), SESSION_RENEW_WORKERS)) as executor:
+        return sum(executor.map(renew_session, due))
+
+
+def _ap_query_key(qid, args, username):
     ap_query_key_tag = str(username) + str(args) + str(SECRET_KEY)
-    ap_query_key = qid + \
+
+    return qid + \
         hashlib.sha512(
             bytes(ap_query_key_tag, "utf-8")).hexdigest()
 
+
+def ap_query(session, qid=None, args=None,
+             username=None, expire=AP_QUERY_EXPIRE):
+    ap_query_key = _ap_query_key(qid, args, username)
+
     if not red.exists(ap_query_key):
         ap_query_content = parse.parse(qid, ap.query(session, qid, args))
-
-        red.set(ap_query_key, json.dumps(ap_query_content, ensure_ascii=False))
-        red.expire(ap_query_key, expire)
+        ap_query_dump = json.dumps(ap_query_content, ensure_ascii=False)
+
+        # Content hash saved next to the entry, for conditional GET
+        pipe = red.pipeline()
+        pipe.set(ap_query_key, ap_query_dump, ex=expire)
+        pipe.set(ap_query_key + AP_QUERY_ETAG_TAG,
+                 hashlib.sha1(ap_query_dump.encode("utf-8")).hexdigest(),
+                 ex=expire)
+        pipe.execute()
     else:
         ap_query_content = json.loads(red.get(ap_query_key))
 
     return ap_query_content
 
 
-def leave_query(session, year="102", semester="2"):
-    return leave.getList(session, year, semester)
+def ap_query_etag(qid=None, args=None, username=None):
+    """Return content hash of cached ap query, without loading content.
+
+    :return: etag or None if not cached
+    :rtype: str or None
+    """
+    etag = red.get(_ap_query_key(qid, args, username) + AP_QUERY_ETAG_TAG)
+
+    return etag.decode("utf-8") if etag else None
+
+
+def ap_query_rendered(session, qid, args, username, render,
+                      expire=AP_QUERY_EXPIRE, tag=AP_QUERY_RENDERED_TAG):
+    """ap query rendered to response body by `render`, the body is
+    rendered once and cached next to the query.
+
+    :param render: function from query content to response body
+    :type render: callable
+    :param tag: name of rendering, one query can have many renderings
+    :type tag: str
+    :return: (body, etag)
+    :rtype: tuple
+    """
+    rendered_key = _ap_query_key(qid, args, username) + tag
+
+    body, etag = red.hmget(rendered_key, "body", "etag")
+    if body is not None:
+        return body, etag.decode("ascii")
+
+    body = render(ap_query(session, qid, args, username, expire))
+    etag = hashlib.sha1(body).hexdigest()
+
+    pipe = red.pipeline()
+    pipe.hmset(rendered_key, {"body": body, "etag": etag})
+    pipe.expire(rendered_key, expire)
+    pipe.execute()
+
+    return body, etag
+
+
+def ap_query_rendered_etag(qid, args, username, tag=AP_QUERY_RENDERED_TAG):
+    """Return etag of :func:`ap_query_rendered` body, None if not cached.
+
+    :rtype: str or None
+    """
+    etag = red.hget(_ap_query_key(qid, args, username) + tag, "etag")
+
+    return etag.decode("ascii") if etag is not None else None
+
+
+def score_history(session, username, limit=SCORE_HISTORY_LIMIT):
+    """Scores of latest `limit` semesters with cumulative summary,
+    semesters not cached yet are queried concurrently.
+
+    :param session: requests session restored with user cookies
+    :type session: requests.sessions.Session
+    :param username: school id
+    :type username: str
+    :return: semesters and summary, None if semester list unavailable
+    :rtype: dict
+    """
+    history_key = _ap_query_key(SCORE_HISTORY_TAG, limit, username)
+
+    content = red.get(history_key)
+    if content is not None:
+        return json.loads(content)
+
+    semester_list = get_semester_list()
+    if not semester_list:
+        return None
+
+    # From default (current) semester to older
+    current = next((i for i, x in enumerate(semester_list)
+                    if x["selected"] == 1), 0)
+    semester_list = semester_list[current:current + limit]
+
+    def fetch(semester):
+        year, semester = semester["value"].split(",")
+
+        # requests session is not thread-safe, one per query
+        s = requests.Session()
+        s.cookies.update(session.cookies)
+
+        # Same args as score view, share its cache
+        return ap_query(s, "ag008", {"arg01": int(year),
+                                     "arg02": int(semester),
+                                     "arg03": username}, username)
+
+    with ThreadPoolExecutor(
+            max_workers=min(len(semester_list),
+                            SCORE_HISTORY_WORKERS) or 1) as executor:
+        score_tables = list(executor.map(fetch, semester_list))
+
+    semesters = [
+        {"value": semester["value"], "text": semester["text"],
+         "scores": table}
+        for semester, table in zip(semester_list, score_tables) if table]
+
+    history = {
+        "semesters": semesters,
+        "summary": parse.score_summary([x["scores"] for x in semesters])
+    }
+
+    red.set(history_key, json.dumps(history, ensure_ascii=False),
+            ex=AP_QUERY_EXPIRE)
+
+    return history
+
+
+def _leave_key(username, year, semester):
+    leave_key_tag = "%s%s-%s%s" % (username, year, semester, SECRET_KEY)
+
+    return LEAVE_TAG + hashlib.sha256(
+        bytes(leave_key_tag, "utf-8")).hexdigest()
+
+
+class LeaveFormState(object):
+    """ASP.NET form state (__VIEWSTATE, __EVENTVALIDATION...) of leave
+    system pages saved per user, let :mod:`kuas_api.kuas.leave` postback
+    without GET the page first.
+    """
+
+    def __init__(self, username, expire=LEAVE_FORM_STATE_EXPIRE):
+        self.key = LEAVE_FORM_STATE_TAG + username
+        self.expire = expire
+
+    def get(self, page):
+        form = red.hget(self.key, page)
+
+        return json.loads(form) if form is not None else None
+
+    def set(self, page, form):
+        pipe = red.pipeline()
+        pipe.hset(self.key, page, json.dumps(form))
+        pipe.expire(self.key, self.expire)
+        pipe.execute()
+
+
+def leave_query(session, year="102", semester="2", username=None,
+                expire=LEAVE_EXPIRE):
+    """Query leave list, cached per user and semester.
+
+    :param username: school id, None for no cache
+    :type username: str
+    """
+    if username is None:
+        return leave.getList(session, year, semester)
+
+    leave_key = _leave_key(username, year, semester)
+    leave_index_key = LEAVE_INDEX_TAG + username
+
+    content = red.get(leave_key)
+    if content is not None:
+        return json.loads(content)
+
+    def fetch():
+        leaves = leave.getList(session, year, semester,
+                               form_state=LeaveFormState(username))
+
+        pipe = red.pipeline()
+        pipe.set(leave_key, json.dumps(leaves, ensure_ascii=False), ex=expire)
+        pipe.sadd(leave_index_key, leave_key)
+        pipe.expire(leave_index_key, expire)
+        pipe.execute()
+
+        return leaves
+
+    done, leaves = _single_flight(leave_key, fetch)
+    if done:
+        return leaves
+
+    # Other request fetched it for us
+    content = red.get(leave_key)
+
+    return json.loads(content) if content is not None else fetch()
+
+
+def leave_invalidate(username):
+    """Remove all cached leave lists of user"""
+    leave_index_key = LEAVE_INDEX_TAG + username
+    keys = red.smembers(leave_index_key)
+
+    red.delete(leave_index_key, *keys)
 
 
 def leave_submit(session, start_date, end_date,
-                 reason_id, reason_text, section):
+                 reason_id, reason_text, section, username=None):
     leave_dict = {"reason_id": reason_id,
                   "reason_text": reason_text, "section": section}
 
-    return leave.submitLeave(session, start_date, end_date, leave_dict)
+    form_state = LeaveFormState(username) if username is not None else None
+    timings = []
+    result = leave.submitLeave(session, start_date, end_date, leave_dict,
+                               form_state=form_state, timings=timings)
+
+    logger.info("leave submit %s in %.2fs: %s", result[0],
+                sum(t for _, t in timings),
+                ", ".join("%s %.2fs" % step for step in timings))
+
+    # New leave in list now
+    if result[0] and username is not None:
+        leave_invalidate(username)
+
+    return result
+
+
+def leave_submit_enqueue(username, start_date, end_date,
+                         reason_id, reason_text, section):
+    """Queue leave submit for background worker (see :func:`leave_job_run`)
+
+    :param username: school id
+    :type username: str
+    :return: job id
+    :rtype: str
+    """
+    job_id = uuid.uuid4().hex
+    job_key = LEAVE_JOB_TAG + job_id
+
+    pipe = red_auth.pipeline()
+    pipe.hmset(job_key, {
+        "status": "queued",
+        "username": username,
+        "args": json.dumps([start_date, end_date,
+                            reason_id, reason_text, section]),
+        "created_at": time.time(),
+    })
+    pipe.expire(job_key, LEAVE_JOB_EXPIRE)
+    pipe.lpush(LEAVE_JOB_QUEUE, job_id)
+    pipe.execute()
+
+    return job_id
+
+
+def leave_job_status(job_id):
+    """Get leave submit job
+
+    :return: job record, None if not exist or expired
+    :rtype: dict
+    """
+    job = red_auth.hgetall(LEAVE_JOB_TAG + job_id)
+    if not job:
+        return None
+
+    job.pop("args", None)
+    for field in ("created_at", "started_at", "finished_at"):
+        if field in job:
+            job[field] = float(job[field])
+    if "success" in job:
+        job["success"] = job["success"] == "1"
+
+    return job
+
+
+def _user_session(username):
+    """requests session restored with user cookies in redis"""
+    session = requests.Session()
+    session.verify = False
+
+    user_cookies = json.loads(red_auth.get(username))
+    for c in user_cookies["cookies"]:
+        session.cookies.set(c['name'], c['value'], domain=c['domain'])
+
+    return session
+
+
+def leave_job_run(timeout=1):
+    """Wait at most `timeout` seconds for a queued leave submit job,
+    and run it.
+
+    :return: job id, or None if no job
+    :rtype: str
+    """
+    job = red_auth.brpop(LEAVE_JOB_QUEUE, timeout=timeout)
+    if job is None:
+        return None
+
+    job_id = job[1]
+    job_key = LEAVE_JOB_TAG + job_id
+
+    job = red_auth.hgetall(job_key)
+    if not job:
+        return job_id
+
+    red_auth.hmset(job_key, {"status": "running", "started_at": time.time()})
+
+    result = {"status": "failed", "success": 0, "message": "Error..."}
+    try:
+        username = job["username"]
+        session = _user_session(username)
+
+        if subsystem_login(session, username, "leave"):
+            success, message = leave_submit(
+                session, *json.loads(job["args"]), username=username)
+            result = {"status": "done", "success": int(success),
+                      "message": message}
+    except Exception:
+        logger.exception("leave job %s failed", job_id)
+
+    result["finished_at"] = time.time()
+    red_auth.hmset(job_key, result)
+
+    return job_id
 
 
 def bus_query(session, date):
@@ -151,10 +728,111 @@ def bus_booking(session, busId, action):
     return bus.book(session, busId, action)
 
 
+def notification_crawl(max_pages=NOTIFICATION_CRAWL_MAX_PAGES):
+    """Walk notification pages from newest, until reach page ends with
+    notification we have seen, merge crawled ones into notification store.
+
+    Store keep the order of school site: crawled pages replace the top
+    of store (pinned notifications stay on top), older ones follow.
+    Notifications are identified by link, edited one is updated in
+    place instead of stored again.
+
+    :return: count of new or edited notifications
+    :rtype: int
+    """
+    crawled = []
+    links = set()
+    changed = 0
+    page_size = None
+
+    for page in range(1, max_pages + 1):
+        items = notification.get(page)
+        if not items:
+            break
+
+        if page_size is None:
+            page_size = len(items)
+
+        hashes = [notification.item_hash(item) for item in items]
+
+        pipe = red.pipeline()
+        for h in hashes:
+            pipe.sismember(NOTIFICATION_SEEN_KEY, h)
+        seen = pipe.execute()
+
+        for item, is_seen in zip(items, seen):
+            if item["link"] in links:
+                continue
+
+            links.add(item["link"])
+            crawled.append(item)
+            changed += not is_seen
+
+        # Pinned notifications on top, check the oldest one of page
+        if seen[-1]:
+            break
+
+    if page_size:
+        red.set(NOTIFICATION_PAGE_SIZE_KEY, page_size)
+
+    if not changed:
+        return 0
+
+    older = [item for item in map(
+        json.loads, red.lrange(NOTIFICATION_STORE_KEY, 0, -1))
+        if item["link"] not in links]
+    store = (crawled + older)[:NOTIFICATION_STORE_SIZE]
+
+    # Seen set only keep notifications in store
+    pipe = red.pipeline()
+    pipe.delete(NOTIFICATION_STORE_KEY, NOTIFICATION_SEEN_KEY)
+    pipe.rpush(NOTIFICATION_STORE_KEY, *[
+        json.dumps(item, ensure_ascii=False) for item in store])
+    pipe.sadd(NOTIFICATION_SEEN_KEY, *[
+        notification.item_hash(item) for item in store])
+    pipe.incr(NOTIFICATION_VERSION_KEY)
+    pipe.execute()
+
+    return changed
+
+
+def notification_store_range(start, stop):
+    """Get notifications [start, stop) from notification store, newest
+    first, `id` numbered by position.
+
+    :rtype: list
+    """
+    result = []
+    for index, item in enumerate(
+            red.lrange(NOTIFICATION_STORE_KEY, start, stop - 1), start + 1):
+        item = json.loads(item)
+        item["info"]["id"] = str(index)
+        result.append(item)
+
+    return result
+
+
+def notification_page_size():
+    """Notifications per page of school site, None before first crawl"""
+    page_size = red.get(NOTIFICATION_PAGE_SIZE_KEY)
+
+    return int(page_size) if page_size else None
+
+
 def notification_query(page=1):
+    # Slice of crawled store, see notification_crawl
+    page_size = notification_page_size()
+    if page_size:
+        start = (page - 1) * page_size
+        notification_content = notification_store_range(
+            start, start + page_size)
+
+        if notification_content:
+            return notification_content
+
     notification_page = NOTIFICATION_TAG + str(page)
     red_query = red.get(notification_page)
-    red_query = False if red_query is None or red_query == '[]' else True
+    red_query = False if red_query is None or red_query == b'[]' else True
 
     if not red_query:
         notification_content = notification.get(page)
@@ -168,6 +846,59 @@ def notification_query(page=1):
     return notification_content
 
 
+def notification_query_pages(first, last):
+    """Query notifications of pages [first, last] in one go, merged and
+    deduplicated by link.
+
+    Served from notification store if it cover the range, otherwise
+    cached pages are read by one MGET and missing pages are fetched
+    concurrently.
+
+    :rtype: list
+    """
+    page_size = notification_page_size()
+    if page_size:
+        start = (first - 1) * page_size
+        stop = last * page_size
+        notification_content = notification_store_range(start, stop)
+
+        if len(notification_content) == stop - start:
+            return notification_content
+
+    pages = list(range(first, last + 1))
+    keys = [NOTIFICATION_TAG + str(page) for page in pages]
+
+    contents = {}
+    for page, content in zip(pages, red.mget(keys)):
+        if content is not None and content != b'[]':
+            contents[page] = json.loads(content)
+
+    missing = [page for page in pages if page not in contents]
+    if missing:
+        with ThreadPoolExecutor(
+                max_workers=min(len(missing),
+                                NOTIFICATION_FETCH_WORKERS)) as executor:
+            fetched = list(executor.map(notification.get, missing))
+
+        pipe = red.pipeline()
+        for page, content in zip(missing, fetched):
+            contents[page] = content
+            pipe.set(NOTIFICATION_TAG + str(page),
+                     json.dumps(content, ensure_ascii=False),
+                     ex=NOTIFICATION_EXPIRE_TIME)
+        pipe.execute()
+
+    result = []
+    links = set()
+    for page in pages:
+        for item in contents[page]:
+            if item["link"] not in links:
+                links.add(item["link"])
+                result.append(item)
+
+    return result
+
+
 def news_query():
     return news.news()
 
@@ -192,6 +923,79 @@ def server_status():
     return server_status
 
 
+_guest = threading.local()
+
+
+def _guest_session():
+    """AP guest session of current thread"""
+    session = getattr(_guest, "session", None)
+
+    if session is None:
+        session = requests.Session()
+        ap.login(session, AP_GUEST_ACCOUNT, AP_GUEST_PASSWORD)
+        _guest.session = session
+
+    return session
+
+
+def catalog_crawl(yms=None):
+    """Crawl public course catalog (ag202) of semester, one query per
+    weekday and period, save merged catalog to redis.
+
+    :param yms: semester like "106,1", default is current semester
+    :type yms: str
+    :return: count of courses
+    :rtype: int
+    """
+    if yms is None:
+        semester_list = get_semester_list()
+        if not semester_list:
+            return 0
+
+        yms = next((x["value"] for x in semester_list if x["selected"] == 1),
+                   semester_list[0]["value"])
+
+    year, semester = yms.split(",")
+
+    def fetch(slot):
+        weekday, period = slot
+        content = ap.query(_guest_session(), "ag202", {
+            "yms_yms": "%s#%s" % (year, semester),
+            "dgr_id": "", "unt_id": "", "clyear": "",
+            "sub_name": "", "teacher": "",
+            "week": weekday, "period": period, "reading": "reading"})
+
+        return parse.course_catalog(content)
+
+    slots = [(w, p) for w in CATALOG_WEEKDAYS for p in CATALOG_PERIODS]
+    with ThreadPoolExecutor(max_workers=CATALOG_WORKERS) as executor:
+        results = list(executor.map(fetch, slots))
+
+    # Same course show in every slot it takes
+    courses = {}
+    for slot, slot_courses in zip(slots, results):
+        for c in slot_courses:
+            key = c.get("id") or (c["title"], c.get("department"),
+                                  tuple(c["instructors"]))
+            course = courses.setdefault(key, dict(c, slots=[]))
+            course["slots"].append(list(slot))
+
+    # AP system down, keep the old one
+    if not courses:
+        logger.warning("no course parsed from ag202 of %s, "
+                       "AP down or page layout changed", yms)
+        return 0
+
+    pipe = red.pipeline()
+    pipe.set(CATALOG_KEY, json.dumps(
+        {"semester": yms, "courses": list(courses.values())},
+        ensure_ascii=False))
+    pipe.incr(CATALOG_VERSION_KEY)
+    pipe.execute()
+
+    return len(courses)
+
+
 def get_semester_list():
     """Get semester list from ap system.
 
@@ -202,7 +1006,10 @@ def get_semester_list():
     """
 
     s = requests.Session()
-    ap.login(s, AP_GUEST_ACCOUNT, AP_GUEST_PASSWORD)
+
+    # Guest login only when semester list not cached
+    if not red.exists(_ap_query_key("ag304_01", None, None)):
+        ap.login(s, AP_GUEST_ACCOUNT, AP_GUEST_PASSWORD)
 
     content = ap_query(s, "ag304_01")
     if len(content) < 3000:
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""Search public course catalog crawled by
+:func:`kuas_api.kuas.cache.catalog_crawl`, and find free classrooms.
+
+Index is kept in process memory, reloaded when catalog version changed.
+"""
+
+import json
+import time
+import threading
+from itertools import compress
+from collections import defaultdict
+
+import kuas_api.kuas.cache as cache
+from kuas_api.kuas.search import tokenize
+
+#: Seconds between checking catalog version
+CATALOG_VERSION_CHECK_INTERVAL = 5
+#: Fields searched by keywords
+CATALOG_FIELDS = ("title", "department", "instructors")
+
+#: Binary digit to 0 or 1 byte, selectors of :func:`itertools.compress`
+_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+class CatalogIndex(object):
+    """Immutable index of course catalog, keyword tokens and
+    (weekday, period) slots to course ids.
+    """
+
+    def __init__(self, semester="", courses=()):
+        self.semester = semester
+        self.courses = tuple(courses)
+        self.postings = defaultdict(set)
+        self.slots = defaultdict(set)
+
+        for course_id, c in enumerate(self.courses):
+            for field in CATALOG_FIELDS:
+                value = c.get(field) or ""
+                if isinstance(value, list):
+                    value = u" ".join(value)
+
+                for token in tokenize(value, unigrams=True):
+                    self.postings[token].add(course_id)
+
+            for weekday, period in c["slots"]:
+                self.slots[(weekday, period)].add(course_id)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def search(self, query="", weekday=None, period=None, limit=50):
+        """Courses match all keywords and take the slot
+
+        :param query: keywords of title, department or instructor
+        :type query: str
+        :param weekday: 1 (Monday) ~ 7, None for any
+        :type weekday: int
+        :param period: period number, None for any
+        :type period: int
+        :param limit: max results
+        :type limit: int
+        :rtype: list
+        """
+        candidates = []
+
+        for token in set(tokenize(query)):
+            candidates.append(self.postings.get(token, set()))
+
+        if weekday is not None or period is not None:
+            candidates.append(set().union(*(
+                ids for (w, p), ids in self.slots.items()
+                if (weekday is None or w == weekday) and
+                (period is None or p == period))))
+
+        if not candidates:
+            return []
+
+        candidates.sort(key=len)
+        matched = set(candidates[0])
+        for ids in candidates[1:]:
+            matched.intersection_update(ids)
+
+        return [self.courses[i] for i in sorted(matched)[:limit]]
+
+
+class RoomOccupancy(object):
+    """Occupied rooms of every period, one bit per room.
+
+    ``occupied[(weekday, period)]`` is an int with bit ``i`` set when
+    ``rooms[i]`` has course in that period, ``known`` has bits of rooms
+    in catalog. A query ORs bitsets of the periods and clears them from
+    ``known``, no loop over rooms. Rooms are numbered in name order, so
+    results are sorted. Only bits of rooms whose courses changed are
+    rewritten on catalog refresh.
+    """
+
+    WEEKDAYS = range(1, 8)
+    PERIODS = range(1, 17)
+
+    def __init__(self):
+        self.rooms = []
+        self.room_index = {}
+        self.room_slots = {}
+        self.known = 0
+        self.occupied = {(w, p): 0 for w in self.WEEKDAYS
+                         for p in self.PERIODS}
+
+    def __len__(self):
+        return bin(self.known).count("1")
+
+    def update(self, courses):
+        """Apply new catalog, return count of rooms changed
+
+        :rtype: int
+        """
+        room_slots = defaultdict(set)
+        for c in courses:
+            if not c.get("room"):
+                continue
+
+            for weekday, period in c["slots"]:
+                if (weekday, period) in self.occupied:
+                    room_slots[c["room"]].add((weekday, period))
+
+        changed = [room for room in set(room_slots) | set(self.room_slots)
+                   if room_slots.get(room) != self.room_slots.get(room)]
+
+        new_rooms = room_slots.keys() - self.room_index.keys()
+        if new_rooms:
+            # Bits follow room order so results need no sort, renumber
+            # every room when there is a new one (new semester)
+            self.rooms = sorted(set(self.rooms) | new_rooms)
+            self.room_index = {room: i for i, room in enumerate(self.rooms)}
+            self.room_slots = {}
+            self.known = 0
+            self.occupied = dict.fromkeys(self.occupied, 0)
+
+        for room in (changed if not new_rooms else room_slots):
+            bit = 1 << self.room_index[room]
+
+            for slot in self.room_slots.get(room, ()):
+                self.occupied[slot] &= ~bit
+            for slot in room_slots.get(room, ()):
+                self.occupied[slot] |= bit
+
+            # Room not in catalog anymore, we know nothing about it
+            if room in room_slots:
+                self.known |= bit
+            else:
+                self.known &= ~bit
+
+        self.room_slots = dict(room_slots)
+
+        return len(changed)
+
+    def free_rooms(self, weekday, first, last):
+        """Rooms without course in periods [first, last] of weekday
+
+        :rtype: list
+        """
+        occupied = 0
+        for period in range(first, last + 1):
+            occupied |= self.occupied.get((weekday, period), 0)
+
+        # Binary digits of free rooms, lowest bit (room 0) first
+        free = bin(self.known & ~occupied)[:1:-1].encode("ascii")
+
+        return list(compress(self.rooms, free.translate(_BITS)))
+
+
+_index = CatalogIndex()
+_occupancy = RoomOccupancy()
+_index_version = None
+_index_checked_at = 0
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return catalog index, reload when catalog version changed
+    (checked at most every :data:`CATALOG_VERSION_CHECK_INTERVAL`).
+    """
+    global _index, _index_version, _index_checked_at
+
+    now = time.time()
+    if now - _index_checked_at < CATALOG_VERSION_CHECK_INTERVAL:
+        return _index
+
+    with _index_lock:
+        version = cache.red.get(cache.CATALOG_VERSION_KEY)
+        _index_checked_at = now
+
+        if version is not None and version != _index_version:
+            catalog = json.loads(cache.red.get(cache.CATALOG_KEY))
+            _index = CatalogIndex(catalog["semester"], catalog["courses"])
+            _occupancy.update(catalog["courses"])
+            _index_version = version
+
+    return _index
+
+
+def get_occupancy():
+    """Return room occupancy, updated with catalog (see :func:`get_index`)
+    """
+    get_index()
+
+    return _occupancy
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    titles = [u"資料結構", u"演算法", u"計算機網路", u"微積分", u"英文",
+              u"體育", u"作業系統", u"線性代數", u"物理", u"經濟學"]
+    teachers = [u"王大明", u"李小華", u"張道行", u"陳忠信", u"林威成"]
+
+    courses = []
+    for n in range(3000):
+        courses.append({
+            "id": str(n), "title": random.choice(titles) + str(n % 7),
+            "department": u"四資工%d甲" % (n % 4 + 1),
+            "instructors": [random.choice(teachers)],
+            "room": u"資%d" % (200 + n % 400),
+            "slots": [[n % 5 + 1, p] for p in range(n % 10 + 1, n % 10 + 4)],
+        })
+
+    start = time.time()
+    index = CatalogIndex("106,1", courses)
+    print("build %d courses %.1f ms" % (len(index), (time.time() - start) * 1000))
+
+    occupancy = RoomOccupancy()
+    start = time.time()
+    occupancy.update(courses)
+    print("occupancy %d rooms %.1f ms" % (
+        len(occupancy), (time.time() - start) * 1000))
+
+    courses[0] = dict(courses[0], slots=[[7, 16]])
+    start = time.time()
+    changed = occupancy.update(courses)
+    print("update %d room %.1f ms" % (changed, (time.time() - start) * 1000))
+
+    elapsed = min(timeit.repeat(
+        lambda: occupancy.free_rooms(3, 3, 5), number=1000, repeat=3)) / 1000
+    print("free rooms on Wednesday 3-5: %d rooms %.1f us" % (
+        len(occupancy.free_rooms(3, 3, 5)), elapsed * 1000000))
+
+    for kwargs in ({"query": u"資料結構"}, {"query": u"王大明 演算法"},
+                   {"weekday": 3, "period": 4},
+                   {"query": u"網路", "weekday": 2}):
+        elapsed = min(timeit.repeat(
+            lambda: index.search(**kwargs), number=10, repeat=3)) / 10
+        print("%-40s %3d results %.3f ms" % (
+            kwargs, len(index.search(**kwargs)), elapsed * 1000))
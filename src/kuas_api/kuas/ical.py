@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Render course table (:func:`kuas_api.kuas.parse.course`) to
+iCalendar (RFC 5545), one weekly event per class, consecutive sections
+of the same class are merged into one event.
+"""
+
+import datetime
+import hashlib
+
+#: Timezone of all events
+TZID = "Asia/Taipei"
+UTC_OFFSET = datetime.timedelta(hours=8)
+
+#: Max minutes between sections still merged into one event
+MERGE_GAP = 20
+
+PRODID = "-//kuastw//AP-API//ZH-TW"
+
+VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    "TZID:" + TZID,
+    "BEGIN:STANDARD",
+    "DTSTART:19700101T000000",
+    "TZOFFSETFROM:+0800",
+    "TZOFFSETTO:+0800",
+    "TZNAME:CST",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+WEEKDAYS = "MTWRFSH"
+
+
+def semester_dates(year, semester):
+    """Default date range of semester
+
+    :param year: ROC year, e.g. 106
+    :type year: int
+    :param semester: 1, 2 or summer (3, 4)
+    :type semester: int
+    :return: (first date, last date)
+    :rtype: tuple
+    """
+    year = int(year) + 1911
+    semester = int(semester)
+
+    if semester == 1:
+        return datetime.date(year, 9, 1), datetime.date(year + 1, 1, 20)
+    elif semester == 2:
+        return datetime.date(year + 1, 2, 15), datetime.date(year + 1, 6, 30)
+
+    return datetime.date(year + 1, 7, 1), datetime.date(year + 1, 8, 31)
+
+
+def _minutes(hhmm):
+    hour, minute = hhmm.split(":")
+
+    return int(hour) * 60 + int(minute)
+
+
+def merge_sections(classes):
+    """Merge consecutive sections of same class on the same weekday
+
+    :param classes: :func:`kuas_api.kuas.parse.course` result
+    :type classes: list
+    :return: list of (weekday, start_time, end_time, class)
+    :rtype: list
+    """
+    events = []
+    last = {}
+
+    for c in classes:
+        date = c.get("date")
+        if not date or not date["start_time"] or not date["end_time"]:
+            continue
+
+        weekday = date["weekday"]
+        start, end = date["start_time"], date["end_time"]
+
+        prev = last.get(weekday)
+        if (prev is not None and
+                prev[3]["title"] == c["title"] and
+                prev[3]["location"] == c["location"] and
+                0 <= _minutes(start) - _minutes(prev[2]) <= MERGE_GAP):
+            prev[2] = end
+            continue
+
+        event = [weekday, start, end, c]
+        events.append(event)
+        last[weekday] = event
+
+    return [tuple(e) for e in events]
+
+
+def _escape(text):
+    return (text.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def _fold(line):
+    """Fold content line to 75 octets per line"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return encoded
+
+    lines = []
+    current = b""
+    for char in line:
+        char = char.encode("utf-8")
+        # First line 75 octets, continuation lines start with a space
+        if len(current) + len(char) > (75 if not lines else 74):
+            lines.append(current)
+            current = b""
+        current += char
+    lines.append(current)
+
+    return b"\r\n ".join(lines)
+
+
+def _local(date, hhmm):
+    return "%sT%s00" % (date.strftime("%Y%m%d"), hhmm.replace(":", ""))
+
+
+def coursetable_ical(classes, first_date, last_date, name=u"課表"):
+    """Render course table to iCalendar.
+
+    Output only depend on arguments, so it can be cached and hashed.
+
+    :param classes: :func:`kuas_api.kuas.parse.course` result
+    :type classes: list
+    :param first_date: first date of semester
+    :type first_date: datetime.date
+    :param last_date: last date of semester
+    :type last_date: datetime.date
+    :param name: calendar name
+    :type name: str
+    :rtype: bytes
+    """
+    # Last moment of semester in UTC, required by RRULE UNTIL
+    until = (datetime.datetime.combine(last_date, datetime.time(23, 59, 59)) -
+             UTC_OFFSET).strftime("%Y%m%dT%H%M%SZ")
+    dtstamp = first_date.strftime("%Y%m%dT000000Z")
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:" + PRODID,
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:" + _escape(name),
+        "X-WR-TIMEZONE:" + TZID,
+    ] + VTIMEZONE
+
+    for weekday, start, end, c in merge_sections(classes):
+        # First class date on/after semester start
+        date = first_date + datetime.timedelta(
+            days=(WEEKDAYS.index(weekday) - first_date.weekday()) % 7)
+        if date > last_date:
+            continue
+
+        uid = hashlib.sha1(u"|".join(
+            (weekday, start, end, c["title"], c["location"]["room"])
+        ).encode("utf-8")).hexdigest()
+
+        lines += [
+            "BEGIN:VEVENT",
+            "UID:%s@kuas-api" % uid,
+            "DTSTAMP:" + dtstamp,
+            "DTSTART;TZID=%s:%s" % (TZID, _local(date, start)),
+            "DTEND;TZID=%s:%s" % (TZID, _local(date, end)),
+            "RRULE:FREQ=WEEKLY;UNTIL=" + until,
+            "SUMMARY:" + _escape(c["title"]),
+        ]
+        if c["location"]["room"]:
+            lines.append("LOCATION:" + _escape(c["location"]["room"]))
+        if c["instructors"]:
+            lines.append("DESCRIPTION:" + _escape(u"、".join(c["instructors"])))
+        lines.append("END:VEVENT")
+
+    lines.append("END:VCALENDAR")
+
+    return b"\r\n".join(_fold(line) for line in lines) + b"\r\n"
+
+
+if __name__ == "__main__":
+    classes = [
+        {"title": u"資料結構", "instructors": [u"蕭淳元"],
+         "location": {"building": "", "room": u"育302"},
+         "date": {"weekday": "R", "start_time": "08:10", "end_time": "09:00",
+                  "section": u"第 1 節"}},
+        {"title": u"資料結構", "instructors": [u"蕭淳元"],
+         "location": {"building": "", "room": u"育302"},
+         "date": {"weekday": "R", "start_time": "09:10", "end_time": "10:00",
+                  "section": u"第 2 節"}},
+        {"timecode": []},
+    ]
+    print(coursetable_ical(
+        classes, *semester_dates(106, 1)).decode("utf-8"))
@@ -1,14 +1,24 @@
 #-*- encoding=utf-8
 
+import time
+
 import requests
 from lxml import etree
 
 s = requests.session()
 
+LEAVE_LIST_URL = "http://leave.nkust.edu.tw/AK002MainM.aspx"
 SUBMIT_LEAVE_URL = "http://leave.nkust.edu.tw/CK001MainM.aspx"
 
+# Text must be in a good postback response
+LEAVE_LIST_MARK = "DropDownListYms"
+SUBMIT_LEAVE_DATE_MARK = "DateUCCBegin"
+
 TIMEOUT = 5.0
 
+# Whitespace removed from leave table text
+LEAVE_TEXT_TABLE = str.maketrans("", "", u"\r\n\t\u3000 ")
+
 
 def status():
     leave_status = 400
@@ -60,66 +70,168 @@ def login(session, username, password):
         return True
 
 
-def getList(session, year="102", semester="2"):
-    root = etree.HTML(
-        session.get("http://leave.nkust.edu.tw/AK002MainM.aspx").text)
-
+def _inputs(root):
     form = {}
     for i in root.xpath("//input"):
         form[i.attrib["name"]] = i.attrib[
             "value"] if "value" in i.attrib else ""
-    #print(form)
-    del form['ctl00$ButtonLogOut']
+
+    return form
+
+
+def _harvest_form(session, url):
+    """GET page only for its form state (__VIEWSTATE, __EVENTVALIDATION...)
+    """
+    return _inputs(etree.HTML(session.get(url).text))
+
+
+def _is_postback_ok(r, mark):
+    # Bad ViewState get error page, dead session redirect to login page
+    return r.status_code == 200 and "LogOn.aspx" not in r.url and mark in r.text
+
+
+def _post_list(session, form, year, semester):
+    form = dict(form)
+    form.pop('ctl00$ButtonLogOut', None)
 
     form[
         'ctl00$ContentPlaceHolder1$SYS001$DropDownListYms'] = "%s-%s" % (year, semester)
 
-    r = session.post(
-        "http://leave.nkust.edu.tw/AK002MainM.aspx", data=form)
+    return session.post(LEAVE_LIST_URL, data=form)
+
+
+def getList(session, year="102", semester="2", form_state=None):
+    """Get leave list of semester
+
+    :param form_state: store of ASP.NET form state, with `get(page)` and
+                       `set(page, form)`, reuse it to skip the GET.
+    """
+    form = form_state.get(LEAVE_LIST_URL) if form_state is not None else None
+    reused = form is not None
+    if not reused:
+        form = _harvest_form(session, LEAVE_LIST_URL)
+
+    r = _post_list(session, form, year, semester)
+
+    # Saved form state is outdated, get a new one
+    if reused and not _is_postback_ok(r, LEAVE_LIST_MARK):
+        form = _harvest_form(session, LEAVE_LIST_URL)
+        r = _post_list(session, form, year, semester)
+
     root = etree.HTML(r.text)
 
-    tr = root.xpath("//table")[-1]
+    if form_state is not None:
+        form_state.set(LEAVE_LIST_URL, _inputs(root))
+
+    return parse_leave_list(root)
+
 
-    leave_list = []
+def _leave_row(tr):
+    r = [t.translate(LEAVE_TEXT_TABLE) for t in tr.itertext()]
 
-    # Delete row id, leave id, teacher quote
-    for r_index, r in enumerate(tr):
-        r = list(map(lambda x: x.replace("\r", "").
-                     replace("\n", "").
-                     replace("\t", "").
-                     replace(u"\u3000", "").
-                     replace(" ", ""),
-                     r.itertext()
-                     ))
+    if r and not r[0]:
+        del r[0]
+    if r and not r[-1]:
+        del r[-1]
 
-        if not r[0]:
-            del r[0]
-        if not r[-1]:
-            del r[-1]
+    return r
+
+
+def parse_leave_list(root):
+    """Parse leave list table of AK002MainM.aspx
+
+    :param root: page parsed by lxml
+    :return: leaves, each has leave_sheet_id, date, instructors_comment
+             and leave_sections
+    :rtype: list
+    """
+    rows = iter(root.xpath("//table")[-1])
+
+    # Header row: row id, leave id, date, teacher quote, sections...
+    header = next(rows, None)
+    if header is None:
+        return []
+    sections = _leave_row(header)[4:]
 
-        leave_list.append(r)
     result = []
-    for r in leave_list[1:]:
-        i = len(r)-15
-        for approved in range(4,i):
-            r[3]+= ' , '+r[approved]
-        leave = {
-            "leave_sheet_id": r[1].replace("\xa0", ""),
+    for tr in rows:
+        r = _leave_row(tr)
+
+        # Sections are the last 15 columns, columns between quote and
+        # sections are more teacher quotes
+        i = len(r) - 15
+
+        result.append({
+            "leave_sheet_id": r[1].replace(u"\xa0", ""),
             "date": r[2],
-            "instructors_comment": r[3],
+            "instructors_comment": u" , ".join(r[3:i]) if i > 4 else r[3],
             "leave_sections": [
-                {"section": leave_list[0][index + 4], "reason": s}
-                for index,s in enumerate(r[i:])
+                {"section": section, "reason": reason}
+                for section, reason in zip(sections, r[i:]) if reason
             ]
-        }
+        })
 
-        leave["leave_sections"] = list(
-            filter(lambda x: x["reason"], leave["leave_sections"]))
-        result.append(leave)
     return result
 
 
-def submitLeave(session, start_date, end_date, leave_dict):
+def _timed_post(session, timings, step, url, **kwargs):
+    start = time.time()
+    r = session.post(url, **kwargs)
+
+    if timings is not None:
+        timings.append((step, time.time() - start))
+
+    return r
+
+
+def _post_submit_start(session, form, timings=None):
+    form = dict(form)
+    form.pop('ctl00$ButtonLogOut', None)
+
+    return _timed_post(session, timings, "start", SUBMIT_LEAVE_URL, data=form)
+
+
+def parse_delta(text):
+    """Parse hidden fields from ASP.NET AJAX partial postback response.
+
+    Response is a list of ``length|type|id|content|``.
+
+    :return: hidden field name to value, None if text is not a delta
+    :rtype: dict
+    """
+    fields = {}
+    pos = 0
+
+    try:
+        while pos < len(text):
+            bar = text.index("|", pos)
+            length = int(text[pos:bar])
+            type_end = text.index("|", bar + 1)
+            id_end = text.index("|", type_end + 1)
+            end = id_end + 1 + length
+
+            if text[bar + 1:type_end] == "hiddenField":
+                fields[text[type_end + 1:id_end]] = text[id_end + 1:end]
+
+            pos = end + 1
+    except ValueError:
+        return None
+
+    return fields
+
+
+def _hidden_fields(text):
+    fields = parse_delta(text)
+    if fields is not None:
+        return fields
+
+    root = etree.HTML(text)
+    return {i.attrib['name']: i.attrib.get('value', '')
+            for i in root.xpath("//input[starts-with(@id, '__')]")}
+
+
+def submitLeave(session, start_date, end_date, leave_dict, form_state=None,
+                timings=None):
     """Submit leave data to leave.kaus.edu.tw:446
     session: The session include login cookies
     start_date: Start date for leave
@@ -128,6 +240,8 @@ def submitLeave(session, start_date, end_date, leave_dict):
         reason_id: String, 21 ~ 26.
         reason_text: String, a reason why leave.
         section: List, the number which count on it.
+    form_state: Store of ASP.NET form state, see getList
+    timings: List, append (step, seconds) of every postback if given
 
     return (success, value)
         success: Bool
@@ -135,34 +249,40 @@ def submitLeave(session, start_date, end_date, leave_dict):
     """
 
     # First page
-    r = session.get(SUBMIT_LEAVE_URL)
+    d = form_state.get(SUBMIT_LEAVE_URL) if form_state is not None else None
+    reused = d is not None
+    if not reused:
+        d = _harvest_form(session, SUBMIT_LEAVE_URL)
 
-    root = etree.HTML(r.text)
+    # Setting start date and end date
+    r = _post_submit_start(session, d, timings)
 
-    d = {i.attrib['name']: i.attrib['value'] for i in root.xpath("//input")}
-    del d['ctl00$ButtonLogOut']
+    # Saved form state is outdated, get a new one
+    if reused and not _is_postback_ok(r, SUBMIT_LEAVE_DATE_MARK):
+        reused = False
+        d = _harvest_form(session, SUBMIT_LEAVE_URL)
+        r = _post_submit_start(session, d, timings)
 
-    # Setting start date and end date
-    r = session.post(SUBMIT_LEAVE_URL, data=d)
-    root = etree.HTML(r.text)
+    if form_state is not None and not reused:
+        form_state.set(SUBMIT_LEAVE_URL, d)
 
-    d = {i.attrib['name']: i.attrib['value'] for i in root.xpath("//input[starts-with(@id, '__')]")}
+    d = _hidden_fields(r.text)
     d["ctl00$ContentPlaceHolder1$CK001$DateUCCBegin$text1"] = start_date
     d["ctl00$ContentPlaceHolder1$CK001$DateUCCEnd$text1"] = end_date
     d["ctl00$ContentPlaceHolder1$CK001$ButtonCommit"] = u"下一步"
 
     # Setting leaving section
-    r = session.post(SUBMIT_LEAVE_URL, data=d)
+    r = _timed_post(session, timings, "date", SUBMIT_LEAVE_URL, data=d)
     root = etree.HTML(r.text)
 
     reason_map = {"21": u"事", "22": u"病", "23": u"公", "24": u"喪", "26": u"產"}
 
     # Setting reason id
-    d = {i.attrib['name']: i.attrib['value'] for i in root.xpath("//input[starts-with(@id, '__')]")}
+    d = _hidden_fields(r.text)
     d['ctl00$ContentPlaceHolder1$CK001$RadioButtonListOption'] = leave_dict[
         "reason_id"]
     d['ctl00$ContentPlaceHolder1$CK001$TextBoxReason'] = ""
-    r = session.post(SUBMIT_LEAVE_URL, data=d)
+    r = _timed_post(session, timings, "reason", SUBMIT_LEAVE_URL, data=d)
 
     # Get Teacher id
     teacher_id = root.xpath("//option[@selected='selected']")[0].values()[-1]
@@ -171,36 +291,39 @@ def submitLeave(session, start_date, end_date, leave_dict):
     button = root.xpath(
         "//input[starts-with(@id, 'ContentPlaceHolder1_CK001_GridViewMain_Button_')]")
 
-    for i in leave_dict["section"]:
-        root = etree.HTML(r.text)
-        d = {i.attrib['name']: i.attrib['value'] for i in root.xpath("//input[starts-with(@id, '__')]")}
+    # ASP.NET take only one clicked button per postback, so each section
+    # still cost a postback, but only once per section, and only hidden
+    # fields are read from the partial response.
+    sections = sorted(set(int(i) for i in leave_dict["section"]))
+
+    for i in sections:
+        d = _hidden_fields(r.text)
         d['ctl00$ContentPlaceHolder1$CK001$RadioButtonListOption'] = leave_dict[
             "reason_id"]
         d['ctl00$ContentPlaceHolder1$CK001$TextBoxReason'] = leave_dict[
             'reason_text']
-        d['ctl00$ContentPlaceHolder1$CK001$DropDownListTeacher'] = root.xpath(
-            "//option[@selected='selected']")[0].values()[-1]
-        d[button[int(i)].attrib['name']] = ''
-        d['__ASYNCPOST'] = "ture"
-        r = session.post(SUBMIT_LEAVE_URL, data=d)
+        d['ctl00$ContentPlaceHolder1$CK001$DropDownListTeacher'] = teacher_id
+        d[button[i].attrib['name']] = ''
+        d['__ASYNCPOST'] = "true"
+        r = _timed_post(session, timings, "section:%d" % i,
+                        SUBMIT_LEAVE_URL, data=d)
 
     # Send to last step
-    root = etree.HTML(r.text)
-    d = {i.attrib['name']: i.attrib['value'] for i in root.xpath("//input[starts-with(@id, '__')]")}
+    d = _hidden_fields(r.text)
     d['ctl00$ContentPlaceHolder1$CK001$TextBoxReason'] = leave_dict[
         'reason_text']
     d['ctl00$ContentPlaceHolder1$CK001$ButtonCommit2'] = "下一步"
-    r = session.post(SUBMIT_LEAVE_URL, data=d)
+    r = _timed_post(session, timings, "confirm", SUBMIT_LEAVE_URL, data=d)
 
     # Save leaving submit
-    root = etree.HTML(r.text)
-    d = {i.attrib['name']: i.attrib['value'] for i in root.xpath("//input[starts-with(@id, '__')]")}
+    d = _hidden_fields(r.text)
     d['ctl00$ContentPlaceHolder1$CK001$ButtonSend'] = '存檔'
     files = {"ctl00$ContentPlaceHolder1$CK001$FileUpload1":
              (" ", "", "application/octet-stream")}
 
     # Send to server and save the submit
-    r = session.post(SUBMIT_LEAVE_URL, files=files, data=d)
+    r = _timed_post(session, timings, "save", SUBMIT_LEAVE_URL,
+                    files=files, data=d)
     root = etree.HTML(r.text)
 
     try:
@@ -216,8 +339,117 @@ def submitLeave(session, start_date, end_date, leave_dict):
 
 
 if __name__ == '__main__':
-    s = requests.session()
-    login(s, "", "")
+    # Count round trips to leave system, with and without saved form state
+    class StandInResponse(object):
+        status_code = 200
+        url = SUBMIT_LEAVE_URL
+
+        text = (
+            u"<html><body><form>"
+            u"<input id='__VIEWSTATE' name='__VIEWSTATE' value='vs'/>"
+            u"<input id='__EVENTVALIDATION' name='__EVENTVALIDATION' value='ev'/>"
+            u"<input id='ctl00_ButtonLogOut' name='ctl00$ButtonLogOut' value=''/>"
+            u"<input id='DateUCCBegin' name='DateUCCBegin' value=''/>"
+            u"<input id='ContentPlaceHolder1_CK001_GridViewMain_Button_0' "
+            u"name='Button_0' value=''/>"
+            u"<select name='DropDownListYms'>"
+            u"<option selected='selected' value='t1'>t</option></select>"
+            u"</form><table><tr><td>a</td></tr></table>"
+            u"<script>alert(\"假單存檔成功，請利用假單查詢進行後續作業。\")</script>"
+            u"</body></html>")
+
+    class StandInSession(object):
+        def __init__(self):
+            self.round_trips = 0
+
+        def get(self, url, **kwargs):
+            self.round_trips += 1
+            return StandInResponse()
+
+        post = get
+
+    class DictFormState(dict):
+        def set(self, page, form):
+            self[page] = form
+
+    leave_dict = {"reason_id": "21", "reason_text": "test",
+                  "section": ["0", "0"]}
+    form_state = DictFormState()
+
+    for name, state in (("no state", None), ("cold", form_state),
+                        ("warm", form_state)):
+        session = StandInSession()
+        getList(session, "107", "1", form_state=state)
+        list_trips = session.round_trips
+
+        session = StandInSession()
+        timings = []
+        submitLeave(session, "107/09/25", "107/09/25", leave_dict,
+                    form_state=state, timings=timings)
+        print("%-8s list: %d round trips, submit: %d round trips" % (
+            name, list_trips, session.round_trips))
+        print("         submit steps: %s" % ", ".join(
+            "%s %.1fms" % (step, t * 1000) for step, t in timings))
+
+    # Parse leave list of a long multi-year history, compare to the old
+    # parser (five str.replace per text node)
+    import timeit
+
+    def parse_leave_list_replace(root):
+        leave_list = []
+        for r in root.xpath("//table")[-1]:
+            r = list(map(lambda x: x.replace("\r", "").
+                         replace("\n", "").
+                         replace("\t", "").
+                         replace(u"\u3000", "").
+                         replace(" ", ""),
+                         r.itertext()))
+            if not r[0]:
+                del r[0]
+            if not r[-1]:
+                del r[-1]
+            leave_list.append(r)
+
+        result = []
+        for r in leave_list[1:]:
+            i = len(r) - 15
+            for approved in range(4, i):
+                r[3] += ' , ' + r[approved]
+            leave = {
+                "leave_sheet_id": r[1].replace("\xa0", ""),
+                "date": r[2],
+                "instructors_comment": r[3],
+                "leave_sections": [
+                    {"section": leave_list[0][index + 4], "reason": s}
+                    for index, s in enumerate(r[i:])]
+            }
+            leave["leave_sections"] = list(
+                filter(lambda x: x["reason"], leave["leave_sections"]))
+            result.append(leave)
+        return result
+
+    cell = u"\r\n\t\t<td>\r\n\t\t\t%s\u3000</td>"
+    header = u"<tr>%s</tr>" % u"".join(
+        cell % t for t in [u"", u"假單", u"日期", u"導師"] +
+        [u"第%d節" % n for n in range(15)])
+    rows = []
+    for n in range(3000):
+        quotes = [u"導 師 准", u"系 主 任 准"][:n % 2 + 1]
+        reasons = [u"事" if (n + x) % 3 == 0 else u"" for x in range(15)]
+        rows.append(u"<tr>%s</tr>" % u"".join(
+            cell % t for t in [str(n), u"\xa0%06d" % n, u"107/09/25"] +
+            quotes + reasons))
+    root = etree.HTML(u"<html><body><table>%s%s</table></body></html>" % (
+        header, u"".join(rows)))
+
+    for name, func in (("replace", parse_leave_list_replace),
+                       ("translate", parse_leave_list)):
+        print("%-9s %.2f ms per 3000 leaves" % (
+            name, min(timeit.repeat(lambda: func(root), number=5,
+                                    repeat=3)) / 5 * 1000))
+
+    # s = requests.session()
+    # login(s, "", "")
     #print(submitLeave(s, '103/09/25', '103/09/25', {"reason_id": "21", "reason_text": "testing", "section": ["0", "1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "11", "12", "13", "14"]}))
     # for test 
     # import json
@@ -1,5 +1,7 @@
 #-*- encoding=utf-8
 
+import hashlib
+
 from lxml import etree
 import requests
 
@@ -26,5 +28,20 @@ def get(page=1):
 
     return result
 
+def item_hash(item):
+    """Content hash of notification, from its link, title and date,
+    changed when notification is edited.
+
+    :param item: notification from :func:`get`
+    :type item: dict
+    :rtype: str
+    """
+    info = item["info"]
+    content = "\0".join((item["link"], info.get("title", ""),
+                         info.get("date", "")))
+
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
 if __name__ == "__main__":
     print(get(2))
@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import re
+
 from lxml import etree
 
+from kuas_api.kuas.ap import AP_BASE_URL
+
 
 sections_time = []
 weekdays_abbr = []
+weekdays = {"M": "Monday", "T": "Tuesday", "W": "Wednesday",
+            "R": "Thursday", "F": "Friday", "S": "Saturday",
+            "H": "Sunday"}
 
 
 def parse(fncid, content):
@@ -92,6 +99,24 @@ def course(cont):
     return course_table
 
 
+def group_coursetables(classes):
+    """Group :func:`course` result by weekday name, timecode kept
+    under ``timecode``.
+
+    :rtype: dict
+    """
+    coursetables = {}
+    for c in classes:
+        if 'timecode' in c:
+            coursetables['timecode'] = c['timecode']
+            continue
+
+        weekday = weekdays[c["date"]["weekday"]]
+        coursetables.setdefault(weekday, []).append(c)
+
+    return coursetables
+
+
 def score(cont):
     root = etree.HTML(cont)
 
@@ -136,9 +161,164 @@ def score(cont):
     return {"scores": score_table, "detail": detail}
 
 
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def score_summary(score_tables):
+    """Cumulative credits and weighted average of score tables
+
+    Course withdrawn (停修) or without numeric final score is not
+    counted, score 60 or above earn credits.
+
+    :param score_tables: list of :func:`score` result
+    :type score_tables: list
+    :return: credits_attempted, credits_earned, average
+    :rtype: dict
+    """
+    attempted = 0.0
+    earned = 0.0
+    weighted = 0.0
+
+    for table in score_tables:
+        for row in table.get("scores", []):
+            units = _to_float(row["units"])
+            final_score = _to_float(row["final_score"])
+
+            if not units or final_score is None or u"停修" in row["remark"]:
+                continue
+
+            attempted += units
+            weighted += units * final_score
+            if final_score >= 60:
+                earned += units
+
+    return {
+        "credits_attempted": attempted,
+        "credits_earned": earned,
+        "average": round(weighted / attempted, 2) if attempted else 0.0
+    }
+
+
+#: ag202 column field and header text (first match win)
+CATALOG_HEADERS = (
+    ("id", (u"選課代號", u"課號", u"代號")),
+    ("title", (u"課程名稱", u"科目名稱", u"科目")),
+    ("department", (u"開課班級", u"班級", u"系所")),
+    ("instructors", (u"授課教師", u"教師")),
+    ("units", (u"學分",)),
+    ("required", (u"必選", u"修別")),
+    ("room", (u"上課地點", u"教室")),
+)
+
+
+def _cell_text(cell):
+    return u"".join(cell.itertext()).replace(u"\xa0", u" ").strip()
+
+
+def course_catalog(cont):
+    """Parse public course search (ag202) result, columns are found by
+    header text, so column order change won't break it.
+
+    :return: courses with fields in :data:`CATALOG_HEADERS`
+    :rtype: list
+    """
+    root = etree.HTML(cont) if cont else None
+    if root is None:
+        return []
+
+    for table in root.xpath("//table"):
+        rows = table.xpath("tr|tbody/tr")
+
+        for header_index, header in enumerate(rows):
+            header = [_cell_text(c) for c in header.xpath("td|th")]
+
+            columns = {}
+            for field, names in CATALOG_HEADERS:
+                for index, text in enumerate(header):
+                    if index not in columns.values() and \
+                            any(name in text for name in names):
+                        columns[field] = index
+                        break
+
+            if "title" in columns:
+                break
+        else:
+            continue
+
+        courses = []
+        for r in rows[header_index + 1:]:
+            cells = [_cell_text(c) for c in r.xpath("td")]
+            if len(cells) <= max(columns.values()) or \
+                    not cells[columns["title"]]:
+                continue
+
+            course = {field: cells[index] for field, index in columns.items()}
+            course["instructors"] = [
+                x for x in re.split(u"[,、\\s]+",
+                                    course.get("instructors", "")) if x]
+            courses.append(course)
+
+        return courses
+
+    return []
+
+
+def profile(cont):
+    """Parse user profile page (ag003)
+
+    :return: profile record, ``student_id`` is None and ``message`` is
+             set when page has no profile.
+    :rtype: dict
+    """
+    root = etree.HTML(cont) if cont else None
+    td = root.xpath("//td") if root is not None else []
+
+    record = {
+        "education_system": "",
+        "department": "",
+        "class": "",
+        "student_id": None,
+        "student_name_cht": "",
+        "student_name_eng": "",
+        "picture": "",
+        "message": ""
+    }
+
+    if len(td) > 11:
+        record["education_system"] = (td[3].text or "")[5:]
+        record["department"] = (td[4].text or "")[5:]
+        record["class"] = (td[8].text or "")[5:]
+        record["student_id"] = (td[9].text or "")[5:]
+        record["student_name_cht"] = (td[10].text or "")[5:]
+        record["student_name_eng"] = (td[11].text or "")[5:]
+    elif td:
+        record["message"] = td[0].text or ""
+
+    try:
+        record["picture"] = AP_BASE_URL + "/nkust" + \
+            root.xpath("//img")[0].values()[0][2:]
+    except:
+        pass
+
+    return record
+
+
 parse_function = {"ag222": course, "ag008": score}
 
 
 if __name__ == "__main__":
-    # print(course(open("c.html").read()))
-    pass
+    # Check parser with a page saved from AP, e.g.
+    #   python -m kuas_api.kuas.parse ag202 ag202.html
+    import sys
+    import pprint
+
+    # ag003 and ag202 are parsed by callers, ap query keep them raw
+    parsers = dict(parse_function, ag003=profile, ag202=course_catalog)
+
+    if len(sys.argv) == 3:
+        with open(sys.argv[2], encoding="utf-8") as f:
+            pprint.pprint(parsers[sys.argv[1]](f.read()))
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Full-text search over crawled notifications (see
+:func:`kuas_api.kuas.cache.notification_crawl`).
+
+Index is kept in process memory, built from notification store once,
+then only new or edited notifications are indexed when store version
+changed.
+Chinese text is tokenized into bigrams, others into lower case words.
+"""
+
+import re
+import math
+import heapq
+import time
+import threading
+from collections import defaultdict
+
+import kuas_api.kuas.cache as cache
+import kuas_api.kuas.notification as notification
+
+#: Seconds between checking notification store version
+SEARCH_VERSION_CHECK_INTERVAL = 5
+#: Notifications read from store per round trip
+SEARCH_FETCH_CHUNK = 100
+#: Token weight of fields
+FIELD_WEIGHT = {"title": 2, "department": 1}
+
+_TOKEN_RE = re.compile(u"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+_CJK_RE = re.compile(u"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+
+def tokenize(text, unigrams=False):
+    """Split text into tokens, bigrams for CJK, words for others.
+
+    :param text: text to split
+    :type text: str
+    :param unigrams: CJK characters are tokens too, used when indexing,
+        so one character query (a unigram) can match
+    :type unigrams: bool
+    :rtype: list
+    """
+    tokens = []
+
+    for run in _TOKEN_RE.findall(text.lower()):
+        if not _CJK_RE.match(run) or len(run) == 1:
+            tokens.append(run)
+            continue
+
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if unigrams:
+            tokens.extend(run)
+
+    return tokens
+
+
+class NotificationIndex(object):
+    """Inverted index of notifications, token -> {doc id: weight}.
+
+    Notifications are identified by link, doc id increase with time,
+    newer notification has larger id. Edited notification keep its id.
+    """
+
+    def __init__(self):
+        self.docs = []
+        self.links = {}
+        self.postings = defaultdict(dict)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _tokens(self, info):
+        for field, weight in FIELD_WEIGHT.items():
+            for token in tokenize(info.get(field, ""), unigrams=True):
+                yield token, weight
+
+    def add(self, item):
+        """Index new notification, or reindex edited one
+
+        :return: False if notification is indexed and not changed
+        :rtype: bool
+        """
+        h = notification.item_hash(item)
+        doc_id, old_hash = self.links.get(item["link"], (None, None))
+        if h == old_hash:
+            return False
+
+        # id is position in store, changed by every new notification
+        info = dict(item["info"])
+        info.pop("id", None)
+
+        if doc_id is None:
+            doc_id = len(self.docs)
+            self.docs.append(None)
+        else:
+            old_info = self.docs[doc_id]["info"]
+            for token in set(token for token, _ in self._tokens(old_info)):
+                posting = self.postings[token]
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[token]
+
+        self.docs[doc_id] = {"link": item["link"], "info": info}
+        self.links[item["link"]] = (doc_id, h)
+
+        for token, weight in self._tokens(info):
+            posting = self.postings[token]
+            posting[doc_id] = posting.get(doc_id, 0) + weight
+
+        return True
+
+    def is_indexed(self, item):
+        """Notification is indexed and not changed"""
+        return (self.links.get(item["link"], (None, None))[1] ==
+                notification.item_hash(item))
+
+    def search(self, query, limit=20):
+        """Notifications contain all tokens of query, best match first.
+
+        :param query: search keywords
+        :type query: str
+        :param limit: max results
+        :type limit: int
+        :rtype: list
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+
+        postings = [self.postings.get(token) for token in tokens]
+        if not all(postings):
+            return []
+
+        # Intersect from the rarest token
+        postings.sort(key=len)
+        matched = set(postings[0])
+        for posting in postings[1:]:
+            matched.intersection_update(posting)
+            if not matched:
+                return []
+
+        total = len(self.docs)
+        idf = [math.log(1 + total / len(posting)) for posting in postings]
+
+        scored = heapq.nlargest(limit, (
+            (sum(w * posting[doc_id] for w, posting in zip(idf, postings)),
+             doc_id) for doc_id in matched))
+
+        return [self.docs[doc_id] for _, doc_id in scored]
+
+
+_index = NotificationIndex()
+_index_version = None
+_index_checked_at = 0
+_index_lock = threading.Lock()
+
+
+def _new_items(index):
+    """Read whole store, pick notifications new or edited since indexed.
+
+    Pinned notifications stay on top of store, so can't stop at the
+    first indexed one; store is bounded by
+    :data:`kuas_api.kuas.cache.NOTIFICATION_STORE_SIZE`.
+
+    :return: new or edited notifications, oldest first
+    :rtype: list
+    """
+    new_items = []
+    start = 0
+
+    while True:
+        items = cache.notification_store_range(
+            start, start + SEARCH_FETCH_CHUNK)
+
+        new_items.extend(item for item in items if not index.is_indexed(item))
+
+        if len(items) < SEARCH_FETCH_CHUNK:
+            return new_items[::-1]
+
+        start += SEARCH_FETCH_CHUNK
+
+
+def get_index():
+    """Return notification index, updated when store version changed
+    (checked at most every :data:`SEARCH_VERSION_CHECK_INTERVAL`).
+    """
+    global _index_version, _index_checked_at
+
+    now = time.time()
+    if now - _index_checked_at < SEARCH_VERSION_CHECK_INTERVAL:
+        return _index
+
+    with _index_lock:
+        version = cache.red.get(cache.NOTIFICATION_VERSION_KEY)
+        _index_checked_at = now
+
+        if version is not None and version != _index_version:
+            for item in _new_items(_index):
+                _index.add(item)
+            _index_version = version
+
+    return _index
+
+
+def search(query, limit=20):
+    """Search crawled notifications
+
+    :param query: search keywords, e.g. "獎學金"
+    :type query: str
+    :param limit: max results
+    :type limit: int
+    :rtype: list
+    """
+    return get_index().search(query, limit)
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    words = [u"獎學金", u"申請", u"公告", u"講座", u"徵才", u"活動", u"停課",
+             u"颱風", u"研討會", u"exchange", u"scholarship", u"student"]
+    departments = [u"諮商輔導中心", u"學務處", u"國際事務處", u"圖書館"]
+
+    index = NotificationIndex()
+    for n in range(20000):
+        title = u"".join(random.sample(words, 4)) + str(n)
+        index.add({"link": "http://www.kuas.edu.tw/%d" % n,
+                   "info": {"title": title,
+                            "department": random.choice(departments),
+                            "date": "2018-01-01"}})
+
+    for query in (u"獎學金", u"獎學金 申請", u"scholarship", u"颱風停課", u"獎"):
+        elapsed = min(timeit.repeat(
+            lambda: index.search(query), number=10, repeat=3)) / 10
+        print("%-14s %2d results %.2f ms" % (
+            query, len(index.search(query)), elapsed * 1000))
@@ -1,62 +1,49 @@
 # -*- coding: utf-8 -*-
 
+import json
+
 from flask import g
-import kuas_api.kuas.ap as ap
 import kuas_api.kuas.cache as cache
-from lxml import etree
+import kuas_api.kuas.parse as parse
 
 AP_QUERY_USER_EXPIRE = 300
+AP_QUERY_PROFILE_TAG = ":profile"
 
 
 def _get_user_info(session):
-    """Get user info
+    """Get user profile record, parsed once and cached next to ag003
+    page (see :func:`kuas_api.kuas.parse.profile`)
 
-    return: `lxml.etree._Element`
+    return: dict
     """
 
-    content = cache.ap_query(
-        session, "ag003", {}, g.username, expire=AP_QUERY_USER_EXPIRE)
-
-    root = etree.HTML(content)
+    body, _ = cache.ap_query_rendered(
+        session, "ag003", {}, g.username,
+        lambda content: json.dumps(parse.profile(content)).encode("utf-8"),
+        expire=AP_QUERY_USER_EXPIRE, tag=AP_QUERY_PROFILE_TAG)
 
-    return root
+    return json.loads(body.decode("utf-8"))
 
 
 def get_user_info(session):
-    root = _get_user_info(session)
-    td = root.xpath("//td")
+    record = _get_user_info(session)
 
     result = {
-        "education_system": "",
-        "department": "",
-        "class": "",
-        "student_id": g.username,
-        "student_name_cht": "",
-        "student_name_eng": "",
+        "education_system": record["education_system"],
+        "department": record["department"],
+        "class": record["class"],
+        "student_id": record["student_id"] or g.username,
+        "student_name_cht": record["student_name_cht"],
+        "student_name_eng": record["student_name_eng"],
         "status": 200,
         "message": ""
     }
-    if len(td) > 3 :
-        result["education_system"] = td[3].text[5:]
-        result["department"] = td[4].text[5:]
-        result["class"] = td[8].text[5:]
-        result["student_id"] = td[9].text[5:]
-        result["student_name_cht"] = td[10].text[5:]
-        result["student_name_eng"] = td[11].text[5:]
-    else :
+    if record["student_id"] is None:
         result["status"] = 204
-        result["message"] = td[0].text
-    
+        result["message"] = record["message"]
+
     return result
 
 
 def get_user_picture(session):
-    root = _get_user_info(session)
-
-    try:
-        image = ap.AP_BASE_URL + "/nkust" + \
-            root.xpath("//img")[0].values()[0][2:]
-    except:
-        image = ""
-
-    return image
+    return _get_user_info(session)["picture"]
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Background worker, run periodic tasks and queued jobs (leave submit)
+out of request path.
+
+Session renewal, other periodic tasks and leave job queue run in their
+own threads, a long crawl never delays renewal or queued jobs.
+
+Run with::
+
+    $ python -m kuas_api.kuas.worker
+"""
+
+import time
+import logging
+import threading
+
+from kuas_api import app
+import kuas_api.kuas.cache as cache
+import kuas_api.modules.response_cache as response_cache
+
+#: Seconds between checking due tasks
+TICK = 1.0
+#: Seconds blocking on leave job queue per wait
+LEAVE_JOB_WAIT = 5
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask(object):
+    def __init__(self, interval, func):
+        self.interval = interval
+        self.func = func
+        self.next_run = 0
+
+    def run_if_due(self, now):
+        if now < self.next_run:
+            return
+
+        self.next_run = now + self.interval
+        try:
+            result = self.func()
+            logger.info("%s: %s", self.func.__name__, result)
+        except Exception:
+            logger.exception("%s failed", self.func.__name__)
+
+    def run_forever(self):
+        while True:
+            self.run_if_due(time.time())
+            time.sleep(max(self.next_run - time.time(), TICK))
+
+
+def crawl_notifications():
+    new = cache.notification_crawl()
+
+    # Cached responses are slices of old store
+    if new:
+        response_cache.invalidate("notifications")
+
+    return new
+
+
+#: Renew sessions in its own thread, never wait for crawls
+renew_task = PeriodicTask(60, cache.renew_active_sessions)
+
+#: Tasks run by worker
+periodic_tasks = [
+    PeriodicTask(300, crawl_notifications),
+]
+
+if app.config.get("CATALOG_ENABLE"):
+    periodic_tasks.append(PeriodicTask(86400, cache.catalog_crawl))
+
+
+def run_periodic_tasks():
+    while True:
+        now = time.time()
+        for task in periodic_tasks:
+            task.run_if_due(now)
+
+        time.sleep(TICK)
+
+
+def run_leave_jobs():
+    """Serve leave job queue, never wait for periodic tasks"""
+    while True:
+        try:
+            cache.leave_job_run(timeout=LEAVE_JOB_WAIT)
+        except Exception:
+            logger.exception("leave job queue failed")
+            time.sleep(TICK)
+
+
+def run():
+    for name, target in (("renew", renew_task.run_forever),
+                         ("periodic", run_periodic_tasks)):
+        threading.Thread(target=target, name=name, daemon=True).start()
+
+    run_leave_jobs()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Server build information, resolved once per process.
+
+Docker image write build info file at build time and point
+``BUILD_INFO_FILE`` environment variable to it (see Dockerfile),
+otherwise read `build_info.json` inside `kuas_api` package, then
+fallback to ask git once.
+"""
+
+import os
+import json
+import datetime
+import subprocess
+
+import kuas_api
+
+#: Build info file written at image build
+BUILD_INFO_FILE = os.path.join(
+    os.path.dirname(os.path.realpath(kuas_api.__file__)), "build_info.json")
+
+_build_info = None
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(BUILD_INFO_FILE),
+            stderr=subprocess.DEVNULL).decode("utf-8").strip("\n")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _load():
+    info = {}
+    try:
+        with open(os.environ.get("BUILD_INFO_FILE", BUILD_INFO_FILE)) as f:
+            info = json.load(f)
+    except (IOError, ValueError):
+        pass
+
+    if info.get("revision") in (None, "", "unknown"):
+        info["revision"] = _git_revision()
+    if not info.get("build_time"):
+        info["build_time"] = datetime.datetime.utcnow().strftime(
+            "%Y-%m-%dT%H:%M:%SZ")
+    info["version"] = kuas_api.__version__
+
+    return info
+
+
+def get():
+    """Return build info dict, with `revision`, `version`, `build_time`.
+
+    :rtype: dict
+    """
+    global _build_info
+
+    if _build_info is None:
+        _build_info = _load()
+
+    return _build_info
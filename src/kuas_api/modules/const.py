@@ -10,6 +10,9 @@ device_version = {
 token_duration = 3600
 serect_key = "usapoijupojfa;dsj;lv;ldakjads;lfkjapoiuewqprjf"
 
+# Still accept JWS token issued before HMAC token (transition window)
+legacy_token_accept = True
+
 # HTTP Status Code
 ok = 200
 no_content = 204
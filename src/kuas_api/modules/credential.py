@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Encrypt user password saved with cookies in redis, so we can login
+other school systems later without asking user again.
+
+The key is read from ``CREDENTIAL_KEY`` environment variable, a Fernet
+key from ``python -c "from cryptography.fernet import Fernet;
+print(Fernet.generate_key().decode())"``. Without it passwords are never
+stored, every system is logged in on user login instead.
+"""
+
+import os
+
+from cryptography.fernet import Fernet, InvalidToken
+
+#: Environment variable of credential key
+CREDENTIAL_KEY_ENV = "CREDENTIAL_KEY"
+
+
+def _load_fernet():
+    key = os.environ.get(CREDENTIAL_KEY_ENV)
+    if not key:
+        return None
+
+    return Fernet(key.encode("ascii"))
+
+
+_fernet = _load_fernet()
+
+
+def enabled():
+    """Return True if credential key is set, passwords can be stored
+
+    :rtype: bool
+    """
+    return _fernet is not None
+
+
+def encrypt(password):
+    """Encrypt password
+
+    :param password: user password
+    :type password: str
+    :return: encrypted password, or None if credential key is not set
+    :rtype: str or None
+    """
+    if _fernet is None:
+        return None
+
+    return _fernet.encrypt(str(password).encode("utf-8")).decode("ascii")
+
+
+def decrypt(token):
+    """Decrypt password from :func:`encrypt`
+
+    :param token: encrypted password
+    :type token: str
+    :return: password, or None if token is invalid
+    :rtype: str or None
+    """
+    if not token or _fernet is None:
+        return None
+
+    try:
+        return _fernet.decrypt(token.encode("ascii")).decode("utf-8")
+    except InvalidToken:
+        return None
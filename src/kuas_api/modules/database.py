@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""News database setting.
+
+Default is the SQLite file inside `kuas_api` package, set
+``NEWS_DATABASE_URL`` environment variable to use a database server,
+e.g. ``postgresql://user:password@db/news``.
+"""
+
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+#: Default SQLite database file, relative to `kuas_api` package
+DATABASE_FILE = "news_db.sqlite"
+
+#: SQLite pragmas for many concurrent readers and a rare writer (admin)
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 5000),
+    ("cache_size", -8000),
+    ("mmap_size", 64 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+)
+
+#: Pool setting for SQLite, one sync worker only need few connections
+SQLITE_ENGINE_OPTIONS = {
+    "poolclass": QueuePool,
+    "pool_size": 2,
+    "connect_args": {"check_same_thread": False},
+}
+
+#: Pool setting for database server
+SERVER_ENGINE_OPTIONS = {
+    "pool_size": 5,
+    "pool_recycle": 3600,
+    "pool_pre_ping": True,
+}
+
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute("PRAGMA %s=%s" % (name, value))
+    cursor.close()
+
+
+def database_uri(app):
+    """Return news database URI, ``NEWS_DATABASE_URL`` first,
+    then ``DATABASE_FILE`` (relative to `kuas_api` package).
+    """
+    uri = os.environ.get("NEWS_DATABASE_URL")
+    if uri:
+        return uri
+
+    package_dir = os.path.dirname(
+        os.path.dirname(os.path.realpath(__file__)))
+    database_file = os.path.join(
+        package_dir, app.config.get("DATABASE_FILE", DATABASE_FILE))
+
+    return "sqlite:///" + database_file
+
+
+def init_app(app):
+    """Setting news database config to `app`, must be called before
+    creating :class:`flask_sqlalchemy.SQLAlchemy`.
+    """
+    uri = database_uri(app)
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    app.config.setdefault("SQLALCHEMY_ECHO", False)
+    app.config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)
+
+    if uri.startswith("sqlite"):
+        options = SQLITE_ENGINE_OPTIONS
+    else:
+        options = SERVER_ENGINE_OPTIONS
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", dict(options))
+
+
+if __name__ == "__main__":
+    # Benchmark /latest/news/all through the test client (redis needed),
+    # old database setting (echo, connect every query) against pooled
+    # WAL setting. A miss reload news and compress the response again.
+    import sys
+    import time
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+
+    from kuas_api import app, news_db
+    import kuas_api.views.v2.news as news
+    import kuas_api.modules.response_cache as response_cache
+
+    times = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+
+    # echo handler write to sys.stdout at engine creation, drop it
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    legacy_engine = create_engine(uri, echo=True, poolclass=NullPool)
+    sys.stdout = stdout
+
+    def miss():
+        news._news_table = None
+        response_cache.invalidate("news")
+
+    cases = (
+        ("echo, NullPool, miss", legacy_engine, miss),
+        ("pooled, WAL, miss", news_db.engine, miss),
+        ("pooled, WAL, hit", news_db.engine, lambda: None),
+    )
+
+    client = app.test_client()
+    for name, engine, before_request in cases:
+        news_db.session.remove()
+        news_db.session.configure(bind=engine)
+        miss()
+
+        start = time.time()
+        for _ in range(times):
+            before_request()
+            rv = client.get("/latest/news/all")
+            assert rv.status_code == 200, rv.status_code
+        elapsed = time.time() - start
+
+        print("%-20s %8.1f request/s" % (name, times / elapsed))
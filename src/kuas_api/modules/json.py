@@ -1,5 +1,104 @@
 import json
-from flask import current_app
+from flask import current_app, request, has_app_context, has_request_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+#: Query string flag for asking pretty printed response
+PRETTY_QUERY_ARG = "pretty"
+
+#: Default encoder backend, the fastest one installed
+DEFAULT_ENCODER = "orjson" if orjson is not None else "json"
+
+
+def _json_dumps(obj, pretty=False):
+    if pretty:
+        return json.dumps(obj, indent=2, separators=(',', ': '),
+                          ensure_ascii=False).encode("utf-8")
+
+    return json.dumps(obj, separators=(',', ':'),
+                      ensure_ascii=False).encode("utf-8")
+
+
+def _orjson_dumps(obj, pretty=False):
+    option = orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+
+    try:
+        return orjson.dumps(obj, option=option)
+    except TypeError:
+        # orjson is strict about types (big int, custom objects),
+        # let stdlib handle it.
+        return _json_dumps(obj, pretty)
+
+
+#: Encoder backends, name: callable(obj, pretty) -> bytes
+encoders = {"json": _json_dumps}
+if orjson is not None:
+    encoders["orjson"] = _orjson_dumps
+
+
+def register_encoder(name, func):
+    """Register a JSON encoder backend.
+
+    :param name: backend name, used by ``JSON_ENCODER`` config
+    :type name: str
+    :param func: callable(obj, pretty) which return encoded bytes
+    :type func: callable
+    """
+    encoders[name] = func
+
+
+def get_encoder():
+    """Return encoder backend selected by ``JSON_ENCODER`` config,
+    fallback to :data:`DEFAULT_ENCODER`.
+    """
+    name = DEFAULT_ENCODER
+    if has_app_context():
+        name = current_app.config.get("JSON_ENCODER") or DEFAULT_ENCODER
+
+    return encoders.get(name, encoders[DEFAULT_ENCODER])
+
+
+def wants_pretty():
+    """Pretty print only when asked by ``?pretty=1`` or
+    ``JSON_PRETTYPRINT`` config.
+    """
+    if has_app_context() and current_app.config.get("JSON_PRETTYPRINT"):
+        return True
+
+    if has_request_context():
+        return request.args.get(PRETTY_QUERY_ARG) in ("1", "true")
+
+    return False
+
+
+def dumps(obj, pretty=False):
+    """Serialize `obj` to JSON bytes with current encoder backend.
+
+    :param obj: object to serialize
+    :param pretty: indent output or not
+    :type pretty: bool
+    :rtype: bytes
+    """
+    return get_encoder()(obj, pretty)
+
+
+def json_response(obj, status=200):
+    """Creates a :class:`~flask.Response` with the JSON representation of
+    `obj`, any JSON serializable object (list, str...) is accepted.
+    """
+
+    # Note that we add '\n' to end of response
+    # (see https://github.com/mitsuhiko/flask/pull/1262)
+    return current_app.response_class(
+        dumps(obj, pretty=wants_pretty()) + b'\n',
+        status=status,
+        mimetype='application/json')
 
 
 def jsonify(*args, **kwargs):
@@ -20,35 +119,51 @@ def jsonify(*args, **kwargs):
 
     This will send a JSON response like this to the browser::
 
-        {
-            "username": "admin",
-            "email": "admin@localhost",
-            "id": 42
-        }
+        {"username":"admin","email":"admin@localhost","id":42}
 
     For security reasons only objects are supported toplevel.  For more
     information about this, have a look at :ref:`json-security`.
 
-    This function's response will be pretty printed if it was not requested
-    with ``X-Requested-With: XMLHttpRequest`` to simplify debugging unless
-    the ``JSONIFY_PRETTYPRINT_REGULAR`` config parameter is set to false.
-    Compressed (not pretty) formatting currently means no indents and no
-    spaces after separators.
+    This function's response is compact (no indents and no spaces after
+    separators), it will be pretty printed if requested with ``?pretty=1``
+    or the ``JSON_PRETTYPRINT`` config parameter is set to true.
 
     .. versionadded:: 0.2
     """
 
-    indent = 2
-    separators = (',', ':')
+    return json_response(dict(*args, **kwargs))
 
-    # Note that we add '\n' to end of response
-    # (see https://github.com/mitsuhiko/flask/pull/1262)
-    rv = current_app.response_class(
-        (json.dumps(
-            dict(*args, **kwargs),
-            indent=indent,
-            separators=separators,
-            ensure_ascii=False
-        ), '\n'),
-        mimetype='application/json')
-    return rv
+
+if __name__ == "__main__":
+    # Benchmark encoder backends on representative payloads
+    import timeit
+
+    course = {"title": "資料結構", "instructors": ["王大明"],
+              "location": {"building": "", "room": "資201"},
+              "date": {"start_time": "08:10", "end_time": "09:00",
+                       "weekday": "M", "section": "第 1 節"}}
+    bus = {"EndEnrollDateTime": "2017-08-06 16:50",
+           "runDateTime": "2017-08-07 07:50", "Time": "07:50",
+           "endStation": "燕巢", "busId": "36065", "reserveCount": "12",
+           "limitCount": "999", "isReserve": 0, "SpecialTrain": "0",
+           "SpecialTrainRemark": "", "cancelKey": 0}
+    payloads = {
+        "coursetables": {"status": 200, "messages": "", "coursetables": {
+            d: [course] * 8 for d in ("Monday", "Tuesday", "Wednesday",
+                                      "Thursday", "Friday")}},
+        "bus": {"date": "2017-08-07", "timetable": [bus] * 60},
+    }
+
+    for name, payload in payloads.items():
+        baseline = json.dumps(payload, indent=2, separators=(',', ':'),
+                              ensure_ascii=False).encode("utf-8")
+        print("%s: indent=2 %d bytes" % (name, len(baseline)))
+        print("  %-12s %8.2f us" % ("indent=2", timeit.timeit(
+            lambda: json.dumps(payload, indent=2, separators=(',', ':'),
+                               ensure_ascii=False).encode("utf-8"),
+            number=2000) / 2000 * 1e6))
+
+        for backend, func in sorted(encoders.items()):
+            t = timeit.timeit(lambda: func(payload), number=2000)
+            print("  %-12s %8.2f us %d bytes" % (
+                backend, t / 2000 * 1e6, len(func(payload))))
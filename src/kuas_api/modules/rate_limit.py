@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Token bucket rate limiter, state saved in redis so every worker
+share the same bucket.
+"""
+
+import time
+
+from kuas_api.modules.redis_pool import red
+
+
+RATE_LIMIT_TAG = "rate_limit:"
+
+# KEYS[1]: bucket key
+# ARGV: capacity, refill rate (tokens per second), now (seconds),
+#       cost (0 only check the bucket, without changing it)
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - cost
+    allowed = 1
+end
+
+if cost > 0 then
+    redis.call("HMSET", KEYS[1], "tokens", tokens, "ts", now)
+    redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate))
+end
+
+return allowed
+"""
+
+_script = None
+
+
+def consume(key, capacity, rate, cost=1):
+    """Take one token from bucket `key`.
+
+    :param key: bucket name
+    :type key: str
+    :param capacity: max tokens (burst size)
+    :type capacity: int
+    :param rate: refill tokens per second
+    :type rate: float
+    :param cost: tokens taken, 0 only check the bucket
+    :type cost: int
+    :return: True if allowed, False if bucket is empty
+    :rtype: bool
+    """
+    global _script
+
+    if _script is None:
+        _script = red.register_script(TOKEN_BUCKET_SCRIPT)
+
+    return bool(_script(keys=[RATE_LIMIT_TAG + key],
+                        args=[capacity, rate, time.time(), cost],
+                        client=red.client))
+
+
+def check(key, capacity, rate):
+    """Return True if bucket `key` has a token, without taking it.
+
+    :rtype: bool
+    """
+    return consume(key, capacity, rate, cost=0)
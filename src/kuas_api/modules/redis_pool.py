@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Redis connection manager.
+
+Every module use :data:`red` or :data:`red_auth` from here, the
+connection is created on first use (never at import), and recreated
+after fork, so gunicorn ``--preload`` won't share sockets between
+workers.
+"""
+
+import os
+import redis
+
+#: Redis database number for kuas api
+REDIS_DB = 2
+
+
+class LazyRedis(object):
+    """Proxy of :class:`redis.StrictRedis`, connect lazily per process.
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        pid = os.getpid()
+
+        if self._client is None or self._pid != pid:
+            self._client = redis.StrictRedis.from_url(
+                url=os.environ['REDIS_URL'], db=REDIS_DB, **self._kwargs)
+            self._pid = pid
+
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+red = LazyRedis()
+
+# Get data from redis should be able use without any decode or encode action.
+red_auth = LazyRedis(charset="utf-8", decode_responses=True)
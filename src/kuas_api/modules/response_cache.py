@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Response level cache, save encoded and precompressed response body
+to redis, so cache hit won't serialize or compress again.
+"""
+
+import gzip
+import hashlib
+from functools import wraps
+
+from flask import current_app, request
+
+import kuas_api.kuas.cache as cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+RESPONSE_CACHE_TAG = "response:"
+RESPONSE_CACHE_INDEX_TAG = "response_index:"
+
+#: gzip level, compress once then serve many times, so use the best.
+GZIP_LEVEL = 9
+
+
+def make_etag(body):
+    """Return strong etag of response body
+
+    :param body: response body
+    :type body: bytes
+    :rtype: str
+    """
+    return hashlib.sha1(body).hexdigest()
+
+
+def not_modified(etag, weak=False):
+    """Return 304 response if request If-None-Match contain `etag`,
+    else return None.
+
+    :param etag: etag of resource
+    :type etag: str
+    :param weak: `etag` is a weak validator
+    :type weak: bool
+    """
+    if not etag:
+        return None
+
+    if weak:
+        matched = request.if_none_match.contains_weak(etag)
+    else:
+        matched = request.if_none_match.contains(etag)
+
+    if matched:
+        rv = current_app.response_class(status=304)
+        rv.set_etag(etag, weak=weak)
+        return rv
+
+    return None
+
+
+def _encode_entry(rv):
+    body = rv.get_data()
+
+    entry = {
+        "etag": make_etag(body),
+        "content_type": rv.headers.get("Content-Type", rv.default_mimetype),
+        "identity": body,
+        "gzip": gzip.compress(body, GZIP_LEVEL)
+    }
+    if brotli is not None:
+        entry["br"] = brotli.compress(body)
+
+    return entry
+
+
+def _choose_encoding(entry):
+    accept = request.accept_encodings
+
+    for encoding in ("br", "gzip"):
+        if encoding in entry and accept[encoding]:
+            return encoding
+
+    return "identity"
+
+
+def _serve_entry(entry):
+    encoding = _choose_encoding(entry)
+
+    # Strong etag must differ between encodings of the same body
+    etag = entry["etag"]
+    if encoding != "identity":
+        etag += "-" + encoding
+
+    rv = not_modified(etag)
+    if rv is not None:
+        rv.headers["Vary"] = "Accept-Encoding"
+        return rv
+
+    rv = current_app.response_class(entry[encoding])
+    rv.headers["Content-Type"] = entry["content_type"]
+    if encoding != "identity":
+        # flask_compress skip responses already have Content-Encoding
+        rv.headers["Content-Encoding"] = encoding
+    rv.headers["Vary"] = "Accept-Encoding"
+    rv.set_etag(etag)
+
+    return rv
+
+
+def _load_entry(key):
+    entry = cache.red.hgetall(key)
+    if not entry:
+        return None
+
+    entry = {k.decode("utf-8"): v for k, v in entry.items()}
+    entry["etag"] = entry["etag"].decode("utf-8")
+    entry["content_type"] = entry["content_type"].decode("utf-8")
+
+    return entry
+
+
+def cached_response(expire, tag="default", unless=None):
+    """Cache view response in redis with precompressed variants.
+
+    Only cache 200 response, the cache key is `tag` and request full path
+    (include query string).
+
+    :param expire: cache expire time in seconds
+    :type expire: int
+    :param tag: tag for invalidate group of cache
+    :type tag: str
+    :param unless: called with the response, don't cache it if return True
+    :type unless: callable
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = RESPONSE_CACHE_TAG + tag + ":" + request.full_path
+
+            entry = _load_entry(key)
+            if entry is None:
+                rv = current_app.make_response(f(*args, **kwargs))
+                if rv.status_code != 200 or rv.direct_passthrough:
+                    return rv
+                if unless is not None and unless(rv):
+                    return rv
+
+                entry = _encode_entry(rv)
+
+                pipe = cache.red.pipeline()
+                pipe.hmset(key, entry)
+                pipe.expire(key, expire)
+                pipe.sadd(RESPONSE_CACHE_INDEX_TAG + tag, key)
+                pipe.expire(RESPONSE_CACHE_INDEX_TAG + tag, expire)
+                pipe.execute()
+
+            return _serve_entry(entry)
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(tag):
+    """Remove all cached responses under `tag`
+
+    :param tag: tag given to :func:`cached_response`
+    :type tag: str
+    """
+    index_key = RESPONSE_CACHE_INDEX_TAG + tag
+    keys = cache.red.smembers(index_key)
+
+    cache.red.delete(index_key, *keys)
@@ -1,28 +1,52 @@
 # -*- coding: utf-8 -*-
 
-import os
+import hmac
 import json
-import redis
+import time
+import base64
+import hashlib
 import requests
-from flask import g, abort
+from flask import g, abort, request, make_response
 from flask_httpauth import HTTPBasicAuth
 from itsdangerous import (TimedJSONWebSignatureSerializer
                           as Serializer, BadSignature, SignatureExpired)
 
 
+from kuas_api import secret_key
 import kuas_api.kuas.cache as cache
 import kuas_api.modules.const as const
+import kuas_api.modules.credential as credential
 import kuas_api.modules.error as error
+import kuas_api.modules.rate_limit as rate_limit
+from kuas_api.modules.redis_pool import red
 
 # Create HTTP auth
 auth = HTTPBasicAuth()
 
-# Redis connection
-red = redis.StrictRedis.from_url(url=os.environ['REDIS_URL'], db=2)
-
 # Shit lazy key
-DIRTY_SECRET_KEY = red.get("SECRET_KEY") if red.exists(
-    "SECRET_KEY") else str(os.urandom(32))
+DIRTY_SECRET_KEY = secret_key
+
+#: HMAC token format: kt1.<username>.<expires>.<generation>.<signature>
+TOKEN_VERSION = "kt1"
+TOKEN_PREFIX = TOKEN_VERSION + "."
+
+#: Cookies generation of user, the generation in token must match it
+GENERATION_TAG = "generation:"
+
+#: Recently failed login, keyed by salted hash of credentials
+FAILED_LOGIN_TAG = "failed_login:"
+FAILED_LOGIN_EXPIRE = 60
+
+#: Failed login token bucket per user and per IP,
+#: (capacity, tokens per second)
+LOGIN_USER_BUCKET = (5, 1 / 12.0)
+LOGIN_IP_BUCKET = (30, 0.5)
+
+# Precomputed keys, only copy them on each request
+_legacy_serializer = Serializer(DIRTY_SECRET_KEY)
+_token_mac = hmac.new(
+    hashlib.sha256(b"auth-token" + DIRTY_SECRET_KEY).digest(),
+    digestmod=hashlib.sha256)
 
 
 def check_cookies(username):
@@ -43,22 +67,44 @@ def set_cookies(s, username):
     :type username: str
     :return: None
     """
-    cookies = json.loads(str(red.get(username), "utf-8"))['cookies']
+    user_cookies = json.loads(str(red.get(username), "utf-8"))
 
-    for c in cookies:
+    # Not renewed by background worker, school session is dead
+    if (cache.session_need_renew(user_cookies, cache.SESSION_EXPIRE_AGE) and
+            cache.renew_session(username)):
+        user_cookies = json.loads(str(red.get(username), "utf-8"))
+
+    for c in user_cookies['cookies']:
         s.cookies.set(c['name'], c['value'], domain=c['domain'])
 
 
-def get_requests_session_with_cookies():
+def get_requests_session_with_cookies(system=None):
+    """Return requests session with user cookies restored.
+
+    :param system: "bus" or "leave", login it first if not yet
+    :type system: str
+    :rtype: requests.sessions.Session
+    """
     s = requests.Session()
     s.verify = False
 
     if g.username:
         set_cookies(s, g.username)
 
+        if system:
+            cache.subsystem_login(s, g.username, system)
+
     return s
 
 
+def _sign(payload):
+    mac = _token_mac.copy()
+    mac.update(payload)
+
+    # 18 bytes digest -> 24 chars, no base64 padding
+    return base64.urlsafe_b64encode(mac.digest()[:18])
+
+
 def generate_auth_token(username, cookies, expiration=600):
     """Generate auth token and save cookies to redis by username
     :param username: usrename (school id)
@@ -66,25 +112,60 @@ def generate_auth_token(username, cookies, expiration=600):
     :param cookies: cookies list from :class:`requests.Session.cookies`
     :type cookies: :class:`requests.cookies.RequestsCookieJar`
     :return: auth token
-    :rtype: str
+    :rtype: bytes
     """
-    s = Serializer(DIRTY_SECRET_KEY, expires_in=expiration)
+    now = time.time()
+    generation_key = GENERATION_TAG + username
+
+    # School session is kept alive by renewal, then cookies live with
+    # token. Without stored credential it can't be renewed, cookies die
+    # with school session and user login again.
+    if credential.enabled() and cookies.get("credential"):
+        cookies_expire = expiration
+    else:
+        cookies_expire = min(expiration, cache.SESSION_EXPIRE_AGE)
 
-    red.set(username, json.dumps(cookies), ex=600)
+    # Keep generation while cookies are alive, so tokens issued
+    # to other devices of the same user stay valid.
+    pipe = red.pipeline()
+    pipe.set(username, json.dumps(cookies), ex=cookies_expire)
+    pipe.set(generation_key, str(int(now * 1000)), ex=cookies_expire,
+             nx=True)
+    pipe.expire(generation_key, cookies_expire)
+    pipe.get(generation_key)
+    generation = pipe.execute()[-1].decode("utf-8")
 
-    return s.dumps({"sid": username})
+    payload = ("%s%s.%d.%s" % (
+        TOKEN_PREFIX, username, int(now) + expiration, generation)
+    ).encode("utf-8")
 
+    return payload + b"." + _sign(payload)
+
+
+def check_token(token):
+    """Check HMAC token signature, without touching redis.
 
-def verify_auth_token(token):
-    """Verify auth token
     :param token: auth token from user
     :type token: str
-    :return: None or username
-    :rtype: str or None
+    :return: None (bad token) or (username, expires, generation)
+    :rtype: tuple or None
     """
-    s = Serializer(DIRTY_SECRET_KEY)
     try:
-        data = s.loads(token)
+        payload, signature = token.encode("utf-8").rsplit(b".", 1)
+        head, expires, generation = payload.rsplit(b".", 2)
+        expires = int(expires)
+    except ValueError:
+        return None
+
+    if not hmac.compare_digest(_sign(payload), signature):
+        return None
+
+    return head[len(TOKEN_PREFIX):].decode("utf-8"), expires, generation
+
+
+def _verify_legacy_token(token):
+    try:
+        data = _legacy_serializer.loads(token)
     except SignatureExpired:
         abort(401)     # valid token, but expired
     except BadSignature:
@@ -93,8 +174,34 @@ def verify_auth_token(token):
     if not check_cookies(data['sid']):
         return None    # Cookies not exist in redis
 
-    user = data['sid']
-    return user
+    return data['sid']
+
+
+def verify_auth_token(token):
+    """Verify auth token
+    :param token: auth token from user
+    :type token: str
+    :return: None or username
+    :rtype: str or None
+    """
+    if not token.startswith(TOKEN_PREFIX):
+        if const.legacy_token_accept:
+            return _verify_legacy_token(token)
+        return None
+
+    checked = check_token(token)
+    if checked is None:
+        return None    # invalid token
+
+    username, expires, generation = checked
+    if expires < time.time():
+        abort(401)     # valid token, but expired
+
+    # Cookies not exist in redis, or replaced by newer login
+    if red.get(GENERATION_TAG + username) != generation:
+        return None
+
+    return username
 
 
 @auth.verify_password
@@ -115,7 +222,27 @@ def verify_password(username_or_token, password):
     if username:
         g.username = username
         g.token = username_or_token
+
+        cache.touch_session(username)
     else:
+        # Same wrong credentials just failed, don't bother school
+        failed_login_key = FAILED_LOGIN_TAG + hashlib.sha256(
+            DIRTY_SECRET_KEY + ("%s\0%s" % (
+                username_or_token, password)).encode("utf-8")).hexdigest()
+        if red.exists(failed_login_key):
+            return False
+
+        # Only failed logins take tokens, a full bucket stop trying.
+        # Last hop of X-Forwarded-For is added by our proxy (caddy)
+        buckets = (("login:user:" + username_or_token, LOGIN_USER_BUCKET),
+                   ("login:ip:" + request.access_route[-1], LOGIN_IP_BUCKET))
+        if not all(rate_limit.check(key, *bucket) for key, bucket in buckets):
+            abort(make_response(error.error_handle(
+                status=429,
+                developer_message="Too many failed login attempts",
+                user_message="Too many login attempts, try again later."),
+                429))
+
         # If auth token is bad (valid token but expired, or invalid token)
         # Then Try to login to school service
         cookies = cache.login(username_or_token, password)
@@ -123,6 +250,9 @@ def verify_password(username_or_token, password):
         # If cookies is False, mean login error
         # return False for unverify password
         if not cookies:
+            red.set(failed_login_key, 1, ex=FAILED_LOGIN_EXPIRE)
+            for key, bucket in buckets:
+                rate_limit.consume(key, *bucket)
             return False
 
         # If return cookies list,
@@ -155,3 +285,24 @@ def auth_error():
         developer_message="Token expired or Unauthorized Access",
         user_message=user_message
     )
+
+
+if __name__ == "__main__":
+    # Microbenchmark of token verify path (without redis)
+    import timeit
+
+    legacy_token = Serializer(DIRTY_SECRET_KEY, expires_in=3600).dumps(
+        {"sid": "1102108133"}).decode("ascii")
+    payload = ("%s1102108133.%d.%d" % (
+        TOKEN_PREFIX, time.time() + 3600, time.time() * 1000)).encode("utf-8")
+    token = (payload + b"." + _sign(payload)).decode("ascii")
+
+    times = 20000
+    for name, func in (
+            ("legacy new serializer", lambda: Serializer(
+                DIRTY_SECRET_KEY).loads(legacy_token)),
+            ("legacy precomputed", lambda: _legacy_serializer.loads(
+                legacy_token)),
+            ("hmac token", lambda: check_token(token))):
+        t = timeit.timeit(func, number=times)
+        print("%-24s %8.2f us" % (name, t / times * 1e6))
@@ -1,6 +1,9 @@
+from flask import current_app
+
 import kuas_api.modules.error as error
+import kuas_api.modules.build_info as build_info
 from flask_apiblueprint import APIBlueprint
-from kuas_api.modules.json import jsonify
+from kuas_api.modules.json import dumps
 
 
 # Create v2 blueprint
@@ -10,22 +13,49 @@ api_v2 = APIBlueprint(
     url_prefix='/v2')
 
 
-def get_git_revision_short_hash():
-    import subprocess
-    return subprocess.check_output(
-        ['git', 'rev-parse', '--short', 'HEAD']).decode("utf-8").strip("\n")
+# Resolve once at startup, never fork git on request
+BUILD_INFO = build_info.get()
+
+VERSION_INFO = {
+    "name": "kuas-api version 2.",
+    "version": "2",
+    "server_revision": BUILD_INFO["revision"],
+    "endpoints": "https://kuas.grd.idv.tw:14769/v2/"
+}
+
+HEALTH_INFO = {
+    "status": "ok",
+    "revision": BUILD_INFO["revision"],
+    "version": BUILD_INFO["version"],
+    "build_time": BUILD_INFO["build_time"]
+}
+
+_static_bodies = {}
+
+
+def static_json(name, obj):
+    """Return JSON response of never changed `obj`, serialize only once.
+    """
+    if name not in _static_bodies:
+        _static_bodies[name] = dumps(obj) + b'\n'
+
+    return current_app.response_class(
+        _static_bodies[name], mimetype='application/json')
 
 
 @api_v2.route('/')
 def version_2():
     """Return API version
     """
-    return jsonify(
-        name="kuas-api version 2.",
-        version="2",
-        server_revision=get_git_revision_short_hash(),
-        endpoints="https://kuas.grd.idv.tw:14769/v2/"
-    )
+    return static_json("version", VERSION_INFO)
+
+
+@api_v2.route('/health')
+def health():
+    """Liveness and readiness check for load balancer,
+    never touch git, redis or school servers.
+    """
+    return static_json("health", HEALTH_INFO)
 
 
 @api_v2.errorhandler(401)
@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
-import json
+import datetime
 
-from flask import request, g
+from flask import request, g, current_app
 from flask_cors import *
 from flask import abort
 import kuas_api.kuas.ap as ap
 import kuas_api.kuas.user as user
 import kuas_api.kuas.cache as cache
+import kuas_api.kuas.parse as parse
+import kuas_api.kuas.ical as ical
+import kuas_api.kuas.catalog as catalog
 
-from kuas_api.modules.json import jsonify
+from kuas_api.modules.json import jsonify, json_response, dumps, wants_pretty
+from kuas_api.modules.response_cache import cached_response, not_modified
 from kuas_api.modules.stateless_auth import auth
 import kuas_api.modules.stateless_auth as stateless_auth
 import kuas_api.modules.const as const
@@ -20,6 +24,11 @@ from .doc import auto
 # https://github.com/mitsuhiko/flask/issues/593
 routes = []
 
+SAMPLE_COURSETABLES_EXPIRE = 3600
+
+#: Max results of course catalog search
+CATALOG_SEARCH_LIMIT = 200
+
 
 def route(rule, **options):
     def decorator(f):
@@ -82,7 +91,7 @@ def ap_user_info():
     # Restore cookies
     s = stateless_auth.get_requests_session_with_cookies()
 
-    return json.dumps(user.get_user_info(s), ensure_ascii=False)
+    return json_response(user.get_user_info(s))
 
 
 @route('/ap/users/picture')
@@ -236,33 +245,132 @@ def get_coursetables(year, semester):
     # See Gist for more infomation.
     # https://gist.github.com/hearsilent/a2570371cc6aa7db97bb
 
-    weekdays = {"M": "Monday", "T": "Tuesday", "W": "Wednesday",
-                "R": "Thursday", "F": "Friday", "S": "Saturday",
-                "H": "Sunday"
-                }
+    args = {"arg01": year, "arg02": semester}
+
+    # Client already have the same content
+    etag = cache.ap_query_rendered_etag("ag222", args, g.username)
+    rv = not_modified(etag, weak=True)
+    if rv is not None:
+        return rv
 
     # Restore cookies
     s = stateless_auth.get_requests_session_with_cookies()
 
-    classes = cache.ap_query(
-        s, "ag222", {"arg01": year, "arg02": semester}, g.username)
+    # Rendered body is compact, pretty print from content
+    if wants_pretty():
+        classes = cache.ap_query(s, "ag222", args, g.username)
+        return json_response(_coursetables_response(classes))
 
-    # No Content
-    if not classes:
-        return jsonify(status=const.no_content, messages="學生目前無選課資料", coursetables=classes)
+    body, etag = cache.ap_query_rendered(
+        s, "ag222", args, g.username,
+        lambda classes: dumps(_coursetables_response(classes)) + b'\n')
+
+    rv = current_app.response_class(body, mimetype='application/json')
+    rv.set_etag(etag, weak=True)
+    return rv
+
+
+@route('/ap/users/coursetables/<int:year>/<int:semester>.ics')
+@auth.login_required
+def get_coursetables_ical(year, semester):
+    """Get user's class schedule as iCalendar feed, for calendar apps.
+
+    Classes repeat weekly from the first to the last date of semester,
+    consecutive sections of the same class are one event.
+
+    :reqheader Authorization: Using Basic Auth
+    :reqheader If-None-Match: ETag of last response
+    :query string start: First date of semester, format: yyyy-mm-dd
+                         (default: 9/1 or 2/15)
+    :query string end: Last date of semester, format: yyyy-mm-dd
+                       (default: 1/20 or 6/30)
+    :statuscode 200: Query successful
+    :statuscode 304: Not modified since last response
+    :statuscode 400: Error date format, or start is after end
+    :statuscode 401: Login failed or auth_token has been expired
+
+    **Request**
+
+    .. sourcecode:: http
+
+        GET /latest/ap/users/coursetables/106/1.ics HTTP/1.1
+        Host: kuas.grd.idv.tw:14769
+        Authorization: Basic xxxxxxxxxxxxx=
+
+    .. sourcecode:: shell
+
+        curl -X GET -u username:password https://kuas.grd.idv.tw:14769/latest/ap/users/coursetables/106/1.ics
+
+    **Response**
+
+    .. sourcecode:: http
+
+        HTTP/1.1 200 OK
+        Content-Type: text/calendar; charset=utf-8
+        ETag: W/"c1ed51b65d7900773dafb489a58685f7313148c0"
+
+        BEGIN:VCALENDAR
+        VERSION:2.0
+        ...
+        BEGIN:VEVENT
+        DTSTART;TZID=Asia/Taipei:20170907T081000
+        DTEND;TZID=Asia/Taipei:20170907T100000
+        RRULE:FREQ=WEEKLY;UNTIL=20180120T155959Z
+        SUMMARY:資料結構
+        LOCATION:育302
+        DESCRIPTION:蕭淳元
+        END:VEVENT
+        END:VCALENDAR
+    """
+    first_date, last_date = ical.semester_dates(year, semester)
+    try:
+        if request.args.get("start"):
+            first_date = datetime.datetime.strptime(
+                request.args["start"], "%Y-%m-%d").date()
+        if request.args.get("end"):
+            last_date = datetime.datetime.strptime(
+                request.args["end"], "%Y-%m-%d").date()
+    except ValueError:
+        return error.error_handle(
+            status=400,
+            developer_message="Error date format, should be yyyy-mm-dd.",
+            user_message="You type a wrong date."), 400
+
+    if first_date > last_date:
+        return error.error_handle(
+            status=400,
+            developer_message="start should not be after end.",
+            user_message="You type a wrong date."), 400
+
+    args = {"arg01": year, "arg02": semester}
+    tag = ":ics:%s:%s" % (first_date, last_date)
+
+    # Restore cookies
+    s = stateless_auth.get_requests_session_with_cookies()
+
+    body, etag = cache.ap_query_rendered(
+        s, "ag222", args, g.username,
+        lambda classes: ical.coursetable_ical(
+            classes or [], first_date, last_date,
+            u"%s-%s 課表" % (year, semester)),
+        tag=tag)
+
+    rv = current_app.response_class(
+        body, mimetype="text/calendar; charset=utf-8")
+    # Body only change with content, ETag is enough to revalidate
+    rv.set_etag(etag, weak=True)
+
+    return rv.make_conditional(request)
 
-    coursetables = {}
-    for c in classes:
-        if 'timecode' in c:
-          coursetables['timecode'] = c['timecode']
-          continue
-        weekday = weekdays[c["date"]["weekday"]]
-        if not weekday in coursetables:
-            coursetables[weekday] = []
 
-        coursetables[weekday].append(c)
+def _coursetables_response(classes):
+    # No Content
+    if not classes:
+        return dict(status=const.no_content, messages="學生目前無選課資料",
+                    coursetables=classes)
 
-    return jsonify(status=const.ok, messages="", coursetables=coursetables)
+    return dict(status=const.ok, messages="",
+                coursetables=parse.group_coursetables(classes))
 
 
 @route('/ap/users/scores/<int:year>/<int:semester>')
@@ -413,16 +521,102 @@ def get_score(year, semester):
           }
         }
     """
+    args = {"arg01": year, "arg02": semester, "arg03": g.username}
+
+    # Client already have the same content
+    etag = cache.ap_query_etag("ag008", args, g.username)
+    rv = not_modified(etag, weak=True)
+    if rv is not None:
+        return rv
+
     # Restore cookies
     s = stateless_auth.get_requests_session_with_cookies()
 
-    scores = cache.ap_query(
-        s, "ag008", {"arg01": year, "arg02": semester, "arg03": g.username}, g.username)
+    scores = cache.ap_query(s, "ag008", args, g.username)
+    etag = etag or cache.ap_query_etag("ag008", args, g.username)
 
     if not scores:
-        return jsonify(status=const.no_content, messages="目前無學生個人成績資料", scores={})
+        rv = jsonify(status=const.no_content, messages="目前無學生個人成績資料", scores={})
+    else:
+        rv = jsonify(status=const.ok, messages="", scores=scores)
+
+    if etag:
+        rv.set_etag(etag, weak=True)
+    return rv
+
+
+@route('/ap/users/scores/history')
+@auth.login_required
+def get_score_history():
+    """Get user's scores of latest semesters, with cumulative summary.
+
+    :reqheader Authorization: Using Basic Auth
+    :query int limit: Semesters to query from current one
+                      (default 10, at most 20)
+    :resjson list semesters: Scores of semesters have score, newest first
+    :resjson object summary: Credits attempted, credits earned and
+                             average weighted by credits
+    :statuscode 200: Query successful
+    :statuscode 401: Login failed or auth_token has been expired
+    :statuscode 502: AP system not available
+
+    **Request**
+
+    .. sourcecode:: http
+
+        GET /latest/ap/users/scores/history?limit=8 HTTP/1.1
+        Host: kuas.grd.idv.tw:14769
+        Authorization: Basic xxxxxxxxxxxxx=
+
+    .. sourcecode:: shell
+
+        curl -X GET -u username:password https://kuas.grd.idv.tw:14769/\\
+        latest/ap/users/scores/history?limit=8
+
+    **Response**
+
+    .. sourcecode:: http
+
+        HTTP/1.1 200 OK
+        Content-Type: application/json
+
+        {
+          "status":200,
+          "messages":"",
+          "semesters":[
+            {
+              "value":"105,2",
+              "text":"105學年度第2學期",
+              "scores":{
+                "detail":{},
+                "scores":[]
+              }
+            }
+          ],
+          "summary":{
+            "credits_attempted":130.0,
+            "credits_earned":124.0,
+            "average":76.42
+          }
+        }
+    """
+    try:
+        limit = int(request.args.get("limit", cache.SCORE_HISTORY_LIMIT))
+    except ValueError:
+        return error.error_handle(
+            status=400,
+            developer_message="Error value for limit.",
+            user_message="You type a wrong value for limit."), 400
+
+    # Restore cookies
+    s = stateless_auth.get_requests_session_with_cookies()
+
+    history = cache.score_history(
+        s, g.username, min(max(limit, 1), cache.SCORE_HISTORY_MAX))
+    if history is None:
+        abort(502)
 
-    return jsonify(status=const.ok, messages="", scores=scores)
+    return jsonify(status=const.ok, messages="", **history)
 
 
 @route('/ap/samples/coursetables/normal')
@@ -431,6 +625,7 @@ def get_score(year, semester):
 @route('/ap/samples/coursetables/weekends')
 @route('/ap/samples/coursetables/multiinstructors')
 @route('/ap/samples/coursetables/wtf')
+@cached_response(SAMPLE_COURSETABLES_EXPIRE, tag="samples")
 def get_sample_coursetables():
     sample_data = {
         "normal": {'Wednesday': [{'date': {'weekday': 'W', 'end_time': '14:20', 'start_time': '13:30', 'section': '第 5 節'}, 'location': {'room': '南101', 'building': ''}, 'instructors': ['張道行'], 'title': '演算法'}, {'date': {'weekday': 'W', 'end_time': '15:20', 'start_time': '14:30', 'section': '第 6 節'}, 'location': {'room': '南101', 'building': ''}, 'instructors': ['張道行'], 'title': '演算法'}, {'date': {'weekday': 'W', 'end_time': '16:20', 'start_time': '15:30', 'section': '第 7 節'}, 'location': {'room': '南101', 'building': ''}, 'instructors': ['張道行'], 'title': '演算法'}], 'Thursday': [{'date': {'weekday': 'R', 'end_time': '10:00', 'start_time': '09:10', 'section': '第 2 節'}, 'location': {'room': '資201', 'building': ''}, 'instructors': ['楊孟翰'], 'title': '資料庫'}, {'date': {'weekday': 'R', 'end_time': '11:00', 'start_time': '10:10', 'section': '第 3 節'}, 'location': {'room': '資201', 'building': ''}, 'instructors': ['楊孟翰'], 'title': '資料庫'}, {'date': {'weekday': 'R', 'end_time': '12:00', 'start_time': '11:10', 'section': '第 4 節'}, 'location': {'room': '資201', 'building': ''}, 'instructors': ['楊孟翰'], 'title': '資料庫'}, {'date': {'weekday': 'R', 'end_time': '16:20', 'start_time': '15:30', 'section': '第 7 節'}, 'location': {'room': 'HS210', 'building': ''}, 'instructors': ['詹喆君'], 'title': '延伸通識(人文)-音樂賞析'}, {'date': {'weekday': 'R', 'end_time': '17:20', 'start_time': '16:30', 'section': '第 8 節'}, 'location': {'room': 'HS210', 'building': ''}, 'instructors': ['詹喆君'], 'title': '延伸通識(人文)-音樂賞析'}], 'Tuesday': [{'date': {'weekday': 'T', 'end_time': '09:00', 'start_time': '08:10', 'section': '第 1 節'}, 'location': {'room': '', 'building': ''}, 'instructors': ['陳忠信'], 'title': '體育－羽球'}, {'date': {'weekday': 'T', 'end_time': '10:00', 'start_time': '09:10', 'section': '第 2 節'}, 'location': {'room': '', 'building': ''}, 'instructors': ['陳忠信'], 'title': '體育－羽球'}, {'date': {'weekday': 'T', 'end_time': '14:20', 'start_time': '13:30', 'section': '第 5 節'}, 'location': {'room': '南108', 'building': ''}, 'instructors': ['林威成'], 'title': '離散數學'}, {'date': {'weekday': 'T', 'end_time': '15:20', 'start_time': '14:30', 'section': '第 6 節'}, 'location': {'room': '南108', 'building': ''}, 'instructors': ['林威成'], 'title': '離散數學'}, {'date': {'weekday': 'T', 'end_time': '16:20', 'start_time': '15:30', 'section': '第 7 節'}, 'location': {'room': '南108', 'building': ''}, 'instructors': ['林威成'], 'title': '離散數學'}], 'Monday': [{'date': {'weekday': 'M', 'end_time': '09:00', 'start_time': '08:10', 'section': '第 1 節'}, 'location': {'room': '育302', 'building': ''}, 'instructors': ['林良志'], 'title': '核心通識(五)-民主與法治'}, {'date': {'weekday': 'M', 'end_time': '10:00', 'start_time': '09:10', 'section': '第 2 節'}, 'location': {'room': '育302', 'building': ''}, 'instructors': ['林良志'], 'title': '核心通識(五)-民主與法治'}, {'date': {'weekday': 'M', 'end_time': '14:20', 'start_time': '13:30', 'section': '第 5 節'}, 'location': {'room': '育302', 'building': ''}, 'instructors': ['鐘文鈺'], 'title': '資料壓縮'}, {'date': {'weekday': 'M', 'end_time': '15:20', 'start_time': '14:30', 'section': '第 6 節'}, 'location': {'room': '育302', 'building': ''}, 'instructors': ['鐘文鈺'], 'title': '資料壓縮'}, {'date': {'weekday': 'M', 'end_time': '16:20', 'start_time': '15:30', 'section': '第 7 節'}, 'location': {'room': '育302', 'building': ''}, 'instructors': ['鐘文鈺'], 'title': '資料壓縮'}], 'Friday': [{'date': {'weekday': 'F', 'end_time': '10:00', 'start_time': '09:10', 'section': '第 2 節'}, 'location': {'room': '資201', 'building': ''}, 'instructors': ['王志強'], 'title': '作業系統'}, {'date': {'weekday': 'F', 'end_time': '11:00', 'start_time': '10:10', 'section': '第 3 節'}, 'location': {'room': '資201', 'building': ''}, 'instructors': ['王志強'], 'title': '作業系統'}, {'date': {'weekday': 'F', 'end_time': '12:00', 'start_time': '11:10', 'section': '第 4 節'}, 'location': {'room': '資201', 'building': ''}, 'instructors': ['王志強'], 'title': '作業系統'}]},
@@ -445,6 +640,7 @@ def get_sample_coursetables():
 
 
 @route('/ap/semester')
+@cached_response(cache.AP_QUERY_EXPIRE, tag="semester")
 def ap_semester():
     """Get user's information.
 
@@ -759,9 +955,132 @@ def query_post():
         s, fncid, {"arg01": arg01, "arg02": arg02,
                    "arg03": arg03, "arg04": arg04}, g.username)
 
-    if fncid == "ag222":
-        return json.dumps(query_content)
-    elif fncid == "ag008":
-        return json.dumps(query_content)
-    else:
-        return json.dumps(query_content)
+    return json_response(query_content)
+
+
+@route('/ap/catalog/courses')
+@auto.doc(groups=["public"])
+def catalog_courses():
+    """Search public course catalog of current semester.
+
+    :query string q: keywords of course title, department or instructor,
+                     separated by space, match all of them
+    :query int weekday: 1 (Monday) ~ 7 (Sunday)
+    :query int period: period of day
+    :query int limit: max results (default 50, at most 200)
+    :statuscode 200: Query successful
+    :statuscode 404: Course catalog is disabled
+
+    **Request**
+
+    .. sourcecode:: http
+
+        GET /latest/ap/catalog/courses?q=資料結構&weekday=4 HTTP/1.1
+        Host: kuas.grd.idv.tw:14769
+
+    .. sourcecode:: shell
+
+        curl -X GET "https://kuas.grd.idv.tw:14769/latest/ap/catalog/courses?q=資料結構&weekday=4"
+
+    **Response**
+
+    .. sourcecode:: http
+
+        HTTP/1.1 200 OK
+        Content-Type: application/json
+
+        {
+          "semester":"106,1",
+          "courses":[
+            {
+              "id":"1234",
+              "title":"資料結構",
+              "department":"四資工二甲",
+              "instructors":["蕭淳元"],
+              "units":"3",
+              "required":"必",
+              "room":"育302",
+              "slots":[[4, 2], [4, 3]]
+            }
+          ]
+        }
+    """
+    if not current_app.config.get("CATALOG_ENABLE"):
+        abort(404)
+
+    weekday = request.args.get("weekday", type=int)
+    period = request.args.get("period", type=int)
+    limit = request.args.get("limit", 50, type=int)
+
+    index = catalog.get_index()
+
+    return jsonify(
+        semester=index.semester,
+        courses=index.search(request.args.get("q", ""), weekday, period,
+                             min(max(limit, 1), CATALOG_SEARCH_LIMIT))
+    )
+
+
+@route('/ap/catalog/rooms/free')
+@auto.doc(groups=["public"])
+def catalog_free_rooms():
+    """Find classrooms without course in periods of a weekday, from public
+    course catalog of current semester.
+
+    :query int weekday: 1 (Monday) ~ 7 (Sunday)
+    :query string periods: period range, e.g. ``3-5`` or ``3``
+    :statuscode 200: Query successful
+    :statuscode 400: Error weekday or periods
+    :statuscode 404: Course catalog is disabled
+
+    **Request**
+
+    .. sourcecode:: http
+
+        GET /latest/ap/catalog/rooms/free?weekday=3&periods=3-5 HTTP/1.1
+        Host: kuas.grd.idv.tw:14769
+
+    .. sourcecode:: shell
+
+        curl -X GET "https://kuas.grd.idv.tw:14769/latest/ap/catalog/rooms/free?weekday=3&periods=3-5"
+
+    **Response**
+
+    .. sourcecode:: http
+
+        HTTP/1.1 200 OK
+        Content-Type: application/json
+
+        {
+          "semester":"106,1",
+          "weekday":3,
+          "periods":[3, 5],
+          "rooms":["南101", "資201", "育302"]
+        }
+    """
+    if not current_app.config.get("CATALOG_ENABLE"):
+        abort(404)
+
+    weekday = request.args.get("weekday", type=int)
+    first, _, last = request.args.get("periods", "").partition("-")
+
+    try:
+        first = int(first)
+        last = int(last) if last else first
+    except ValueError:
+        first = last = 0
+
+    if weekday not in range(1, 8) or not 1 <= first <= last <= 16:
+        return error.error_handle(
+            status=400,
+            developer_message="weekday should be 1~7, periods like 3-5.",
+            user_message="You type a wrong weekday or periods."), 400
+
+    occupancy = catalog.get_occupancy()
+
+    return jsonify(
+        semester=catalog.get_index().semester,
+        weekday=weekday,
+        periods=[first, last],
+        rooms=occupancy.free_rooms(weekday, first, last)
+    )
@@ -133,7 +133,7 @@ def timetables():
         date = request.args.get("date")
 
     # Restore cookies
-    s = stateless_auth.get_requests_session_with_cookies()
+    s = stateless_auth.get_requests_session_with_cookies("bus")
 
     return jsonify(date=date, timetable=cache.bus_query(s, date))
 
@@ -145,7 +145,7 @@ def timetables():
 def bus_reservations(bus_id=None, cancel_key=None):
 
     # Restore cookies
-    s = stateless_auth.get_requests_session_with_cookies()
+    s = stateless_auth.get_requests_session_with_cookies("bus")
 
     # Debugging
     user_agent = request.user_agent.string
@@ -1,8 +1,7 @@
 # -*- coding: utf-8 -*-
 import json
-import requests
 
-from flask import request, g
+from flask import request, g, current_app
 from flask_cors import *
 
 import kuas_api.kuas.cache as cache
@@ -10,7 +9,8 @@ import kuas_api.kuas.cache as cache
 from kuas_api.modules.stateless_auth import auth
 import kuas_api.modules.stateless_auth as stateless_auth
 import kuas_api.modules.const as const
-from kuas_api.modules.json import jsonify
+import kuas_api.modules.error as error
+from kuas_api.modules.json import jsonify, json_response
 
 
 from .doc import auto
@@ -85,9 +85,9 @@ def get_leave(year, semester):
             "14"
         ]
     # Restore cookies
-    s = stateless_auth.get_requests_session_with_cookies()
+    s = stateless_auth.get_requests_session_with_cookies("leave")
 
-    leaves = cache.leave_query(s, year, semester)
+    leaves = cache.leave_query(s, year, semester, g.username)
 
     if not leaves:
         return jsonify(status=const.no_content, messages="本學期無缺曠課記錄", leaves=[])
@@ -96,6 +96,14 @@ def get_leave(year, semester):
         return jsonify(status=const.ok, messages="", leaves=leaves,timecode=timecode)
 
 
+def _roc_date(date):
+    """2017/05/30 to 106/05/30"""
+    date = date.split("/")
+    date[0] = str(int(date[0]) - 1911)
+
+    return "/".join(date)
+
+
 @route('/leave/submit', methods=['POST'])
 @auto.doc()
 @cross_origin(supports_credentials=True)
@@ -104,11 +112,14 @@ def leave_submit():
     """Take a user's leave.
 
     :reqheader Authorization: Using Basic Auth
+    :query int async: ``1`` to submit in background, return job id at once
     :fparam start_date: The first leave date
     :fparam end_date: The last leave date
     :fparam reason_id: The reason identifier
     :fparam reason_text: The reason of taking a leave
+    :fparam section: JSON list of leave sections
     :statuscode 200: Query successful
+    :statuscode 202: Leave submit queued, poll `status_url` for result
     :statuscode 401: Login failed or auth_token has been expired
 
     **Request**
@@ -132,33 +143,99 @@ def leave_submit():
         HTTP/1.1 200 OK
         Content-Type: application/json
 
+    with ``async=1``
+
+    .. sourcecode:: http
+
+        HTTP/1.1 202 ACCEPTED
+        Content-Type: application/json
+
+        {
+          "job_id": "0f8fad5bd9cb469fa16570867728950e",
+          "status": "queued",
+          "status_url": "https://kuas.grd.idv.tw:14769/latest/leave/submit/0f8fad5bd9cb469fa16570867728950e"
+        }
+
     """
-    if request.method == 'POST':
-        start_date = request.form['start_date'].replace("-", "/")
-        end_date = request.form['end_date'].replace("-", "/")
-        reason_id = request.form[
-            'reason_id'] if 'reason_id' in request.form else None
-        reason_text = request.form[
-            'reason_text'] if 'reason_text' in request.form else None
-        section = json.loads(
-            request.form['section']) if 'section' in request.form else None
-
-        s = requests.session()
-        set_cookies(s, session['c'])
-
-        start_date = start_date.split("/")
-        start_date[0] = str(int(start_date[0]) - 1911)
-        start_date = "/".join(start_date)
-
-        end_date = end_date.split("/")
-        end_date[0] = str(int(end_date[0]) - 1911)
-        end_date = "/".join(end_date)
-
-        # Fixing, don't send it
-        return json.dumps((False, "請假維修中, 目前無法請假~"), ensure_ascii=False)
-
-        # Fixed
-        # if reason_id and reason_text and section:
-        #    return json.dumps(cache.leave_submit(s, start_date, end_date, reason_id, reason_text, section))
-        # else:
-        #    return json.dumps((False, "Error..."))
+    # Fixing, don't send it
+    if not current_app.config.get("LEAVE_SUBMIT_ENABLE"):
+        return json_response((False, "請假維修中, 目前無法請假~"))
+
+    try:
+        start_date = _roc_date(request.form['start_date'].replace("-", "/"))
+        end_date = _roc_date(request.form['end_date'].replace("-", "/"))
+        section = json.loads(request.form.get('section', 'null'))
+    except (KeyError, ValueError):
+        return json_response((False, "Error..."))
+
+    reason_id = request.form.get('reason_id')
+    reason_text = request.form.get('reason_text')
+
+    if not (reason_id and reason_text and section):
+        return json_response((False, "Error..."))
+
+    if request.values.get("async") in ("1", "true"):
+        job_id = cache.leave_submit_enqueue(
+            g.username, start_date, end_date, reason_id, reason_text, section)
+
+        return json_response({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": "%s/%s" % (request.base_url, job_id)
+        }, status=202)
+
+    s = stateless_auth.get_requests_session_with_cookies("leave")
+
+    return json_response(cache.leave_submit(
+        s, start_date, end_date, reason_id, reason_text, section, g.username))
+
+
+@route('/leave/submit/<job_id>')
+@auth.login_required
+def leave_submit_status(job_id):
+    """Get status of leave submit queued with ``async=1``.
+
+    :reqheader Authorization: Using Basic Auth
+    :resjson string status: ``queued``, ``running``, ``done`` or ``failed``
+    :resjson bool success: Leave saved or not (when done)
+    :resjson string message: Message from leave system (when done)
+    :statuscode 200: Query successful
+    :statuscode 401: Login failed or auth_token has been expired
+    :statuscode 404: Job not exist or expired
+
+    **Request**
+
+    .. sourcecode:: http
+
+        GET /latest/leave/submit/0f8fad5bd9cb469fa16570867728950e HTTP/1.1
+        Host: kuas.grd.idv.tw:14769
+        Authorization: Basic xxxxxxxxxxxxx=
+
+    **Response**
+
+    .. sourcecode:: http
+
+        HTTP/1.1 200 OK
+        Content-Type: application/json
+
+        {
+          "job_id": "0f8fad5bd9cb469fa16570867728950e",
+          "status": "done",
+          "success": true,
+          "message": "假單存檔成功，請利用假單查詢進行後續作業。",
+          "created_at": 1496109600.0,
+          "started_at": 1496109600.2,
+          "finished_at": 1496109606.8
+        }
+
+    """
+    job = cache.leave_job_status(job_id)
+
+    if job is None or job.pop("username") != g.username:
+        return error.error_handle(status=404,
+                                  developer_message="Job not found",
+                                  user_message="查無此請假紀錄"), 404
+
+    job["job_id"] = job_id
+
+    return json_response(job)
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import time
+import bisect
 import random
-import json
 
 from flask import redirect
 
 import kuas_api.kuas.cache as cache
+import kuas_api.modules.response_cache as response_cache
+from kuas_api.modules.json import json_response
 
 
 from kuas_api import admin, app
@@ -16,6 +19,11 @@ from flask_admin.contrib import sqla
 DEFAULT_WEIGHT = 1
 ENABLE = 1
 NEWS_ID = 0
+NEWS_ALL_EXPIRE = 600
+
+NEWS_GENERATION_KEY = "news_generation"
+#: Seconds between checking news have been changed by other worker
+NEWS_GENERATION_CHECK_INTERVAL = 5
 
 # Nestable blueprints problem
 # not sure isn't this a best practice now.
@@ -68,6 +76,12 @@ class NewsInfo(db.Model):
 class NewsAdmin(sqla.ModelView):
     inline_models = (NewsInfo,)
 
+    def after_model_change(self, form, model, is_created):
+        reload_news()
+
+    def after_model_delete(self, model):
+        reload_news()
+
 
 admin.add_view(NewsAdmin(News, db.session))
 
@@ -125,22 +139,45 @@ def build_news_db():
 def check_db():
     import os
 
-    app_dir = os.path.realpath(os.path.driname(__file__))
-    database_path = os.path.join(app_dir, app.config["DATABASE_FILE"])
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if not uri.startswith("sqlite:///"):
+        return
 
-    if not os.path.exists(database_path):
+    if not os.path.exists(uri[len("sqlite:///"):]):
         build_news_db()
 
 
-def random_by_weight(p):
-    choice_id = []
-    for i in range(len(p)):
-        choice_id += [i for _ in range(DEFAULT_WEIGHT + p[i]["news_weight"])]
+class NewsTable(object):
+    """Immutable snapshot of news, with cumulative weight table
+    for weighted random sampling.
+    """
 
-    return p[random.choice(choice_id)]
+    def __init__(self, news_list):
+        self.news = tuple(news_list)
 
+        cumulative = []
+        total = 0
+        for n in self.news:
+            total += max(DEFAULT_WEIGHT + (n["news_weight"] or 0), 0)
+            cumulative.append(total)
 
-def random_news():
+        self.cumulative = tuple(cumulative)
+        self.total = total
+
+    def sample(self):
+        """Random choice one news by weight, O(log n)."""
+        index = bisect.bisect_right(
+            self.cumulative, random.randrange(self.total))
+
+        return self.news[index]
+
+
+_news_table = None
+_news_generation = None
+_news_checked_at = 0
+
+
+def load_news_table():
     news_list = []
 
     for i in News.query.all():
@@ -149,13 +186,51 @@ def random_news():
             "news_weight": i.weight,
             "news_image": i.image,
             "news_url": i.link,
-            "news_content": ""
+            "news_content": i.content
         })
 
-    return random_by_weight(news_list)
+    return NewsTable(news_list)
+
+
+def get_news_table():
+    """Return news snapshot, only reload from database when
+    :func:`reload_news` have been called (by any worker).
+    """
+    global _news_table, _news_generation, _news_checked_at
+
+    now = time.time()
+    if (_news_table is not None and
+            now - _news_checked_at < NEWS_GENERATION_CHECK_INTERVAL):
+        return _news_table
+
+    generation = cache.red.get(NEWS_GENERATION_KEY)
+    _news_checked_at = now
+
+    if _news_table is None or generation != _news_generation:
+        _news_table = load_news_table()
+        _news_generation = generation
+
+    return _news_table
+
+
+def reload_news():
+    """Mark news snapshot outdated, every worker will rebuild it."""
+    global _news_table
+
+    cache.red.incr(NEWS_GENERATION_KEY)
+    _news_table = None
+    response_cache.invalidate("news")
+
+
+def random_news():
+    news = dict(get_news_table().sample())
+    news["news_content"] = ""
+
+    return news
 
 
 @route('/news/all')
+@response_cache.cached_response(NEWS_ALL_EXPIRE, tag="news")
 def news_all():
     """Get all news.
 
@@ -201,17 +276,7 @@ def news_all():
            }
         ]
     """ 
-    ret = []
-    for i in News.query.all():
-        ret.append({
-            "news_title": i.title,
-            "news_weight": i.weight,
-            "news_image": i.image,
-            "news_url": i.link,
-            "news_content": i.content
-        })
-
-    return json.dumps(ret, ensure_ascii=False)
+    return json_response(list(get_news_table().news))
 
 
 @route('/news')
@@ -257,7 +322,7 @@ def news():
 
     news_url = news["news_url"]
 
-    return json.dumps([ENABLE, NEWS_ID, news_title, news_template, news_url])
+    return json_response([ENABLE, NEWS_ID, news_title, news_template, news_url])
 
 
 if __name__ == "__main__":
@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
+import json
+
+from flask import request
 
 import kuas_api.kuas.cache as cache
+import kuas_api.kuas.search as search
+import kuas_api.modules.error as error
 
 from kuas_api.modules.json import jsonify
+from kuas_api.modules.response_cache import cached_response
 
 
 # Nestable blueprints problem
@@ -11,6 +17,16 @@ from kuas_api.modules.json import jsonify
 #from kuas_api.views.v2 import api_v2
 routes = []
 
+#: Max results of notification search
+SEARCH_LIMIT = 50
+#: Max pages of one notification range query
+PAGES_LIMIT = 10
+
+
+def _no_notification(rv):
+    # Upstream failed or store not crawled yet, try again next request
+    return not json.loads(rv.get_data(as_text=True))["notification"]
+
 
 def route(rule, **options):
     def decorator(f):
@@ -27,6 +43,8 @@ def route(rule, **options):
 
 
 @route('/notifications/<int:page>')
+@cached_response(cache.NOTIFICATION_EXPIRE_TIME, tag="notifications",
+                 unless=_no_notification)
 def notification(page):
     """Get KUAS notification
 
@@ -83,3 +101,132 @@ def notification(page):
         page=page,
         notification=cache.notification_query(page)
     )
+
+
+def _parse_pages(pages):
+    """"1-5" to (1, 5), "3" to (3, 3), None if invalid"""
+    first, _, last = pages.partition("-")
+
+    try:
+        first = int(first)
+        last = int(last) if last else first
+    except ValueError:
+        return None
+
+    if first < 1 or last < first or last - first >= PAGES_LIMIT:
+        return None
+
+    return first, last
+
+
+@route('/notifications')
+@cached_response(cache.NOTIFICATION_EXPIRE_TIME, tag="notifications",
+                 unless=_no_notification)
+def notification_pages():
+    """Get KUAS notifications of a range of pages
+
+    :query string pages: page range, e.g. ``1-5`` (at most 10 pages)
+    :statuscode 200: no error
+    :statuscode 400: invalid page range
+
+
+    **Request**
+
+        .. sourcecode:: http
+
+            GET /v2/notifications?pages=1-5 HTTP/1.1
+            Host: https://kuas.grd.idv.tw:14769/v2/notifications?pages=1-5
+
+        .. sourcecode:: shell
+
+            curl -X GET https://kuas.grd.idv.tw:14769/v2/notifications?pages=1-5
+
+    **Response**
+
+        Same as ``/v2/notifications/<page>``, notifications
+        of all pages are merged, duplicated links are removed.
+
+        .. sourcecode:: http
+
+            HTTP/1.0 200 OK
+            Content-Type: application/json
+
+
+            {
+              "pages":[1, 5],
+              "notification":[
+                {
+                  "link":"http://student.kuas.edu.tw/files/13-1002-45032-1.php",
+                  "info":{
+                    "title":"『鄭豐喜國外深造獎助學金』104年度申請辦法公告",
+                    "date":"2015-09-04 ",
+                    "id":"1",
+                    "department":"諮商輔導中心"
+                  }
+                },
+                {}
+              ]
+            }
+    """
+    pages = _parse_pages(request.args.get("pages", "1"))
+    if pages is None:
+        return error.error_handle(
+            status=400,
+            developer_message="pages should be like 1-5, at most %d pages" % (
+                PAGES_LIMIT),
+            user_message="頁數錯誤"), 400
+
+    return jsonify(
+        pages=list(pages),
+        notification=cache.notification_query_pages(*pages)
+    )
+
+
+@route('/notifications/search')
+def notification_search():
+    """Search KUAS notifications by title and department
+
+    :query string q: keywords, separated by space, match all of them
+    :query int limit: max results (default 20, at most 50)
+
+
+    **Request**
+
+        .. sourcecode:: http
+
+            GET /v2/notifications/search?q=獎學金 HTTP/1.1
+            Host: https://kuas.grd.idv.tw:14769/v2/notifications/search?q=獎學金
+
+        .. sourcecode:: shell
+
+            curl -X GET https://kuas.grd.idv.tw:14769/v2/notifications/search?q=獎學金
+
+    **Response**
+
+        .. sourcecode:: http
+
+            HTTP/1.0 200 OK
+            Content-Type: application/json
+
+
+            {
+              "q":"獎學金",
+              "notification":[
+                {
+                  "link":"http://student.kuas.edu.tw/files/13-1002-45032-1.php",
+                  "info":{
+                    "title":"『鄭豐喜國外深造獎助學金』104年度申請辦法公告",
+                    "date":"2015-09-04 ",
+                    "department":"諮商輔導中心"
+                  }
+                }
+              ]
+            }
+    """
+    q = request.args.get("q", "")
+    limit = min(request.args.get("limit", 20, type=int), SEARCH_LIMIT)
+
+    return jsonify(
+        q=q,
+        notification=search.search(q, max(limit, 1))
+    )
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
-from flask import g, jsonify
+from flask import g
 import json
 
 import kuas_api.kuas.cache as cache
 import kuas_api.modules.error as error
 import kuas_api.modules.const as const
 from kuas_api.modules.stateless_auth import auth
+from kuas_api.modules.json import jsonify
+from kuas_api.modules.response_cache import cached_response
 from .doc import auto
 
 # Nestable blueprints problem
@@ -14,6 +16,8 @@ from .doc import auto
 #from kuas_api.views.v2 import api_v2
 routes = []
 
+DEVICE_VERSION_EXPIRE = 600
+
 
 def route(rule, **options):
     def decorator(f):
@@ -40,6 +44,8 @@ def get_auth_token():
     :resjson int duration: The duration of this token to expired.
     :resjson string token_type: Token type of this token.
     :resjson strin gauth_token: Auth token.
+    :resjson object is_login: Login status of ap, bus and leave system,
+                              ``null`` means login on first use.
     :statuscode 200: success login
     :statuscode 401: login fail or auth_token expired
 
@@ -68,7 +74,8 @@ def get_auth_token():
         {
           "duration": 3600,
           "token_type": "Basic",
-          "auth_token": "adfakdflakds.fladkjflakjdf.adslkfakdadf"
+          "auth_token": "adfakdflakds.fladkjflakjdf.adslkfakdadf",
+          "is_login": {"ap": true, "bus": null, "leave": null}
         }
     """
     is_login = json.loads(str(cache.red.get(g.username), "utf-8"))['is_login']
@@ -83,6 +90,7 @@ def get_auth_token():
 
 @route('/versions/<string:device_type>')
 @auto.doc(groups=["public"])
+@cached_response(DEVICE_VERSION_EXPIRE, tag="versions")
 def device_version(device_type):
     """Get latest version for app on (`device_type`) in webstore.
 
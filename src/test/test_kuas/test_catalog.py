@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import kuas_api.kuas.catalog as catalog
+
+
+def course(room, *slots):
+    return {"room": room, "slots": [list(s) for s in slots]}
+
+
+class RoomOccupancyTest(unittest.TestCase):
+    def setUp(self):
+        self.courses = [course(u"資201", (3, 3), (3, 4)),
+                        course(u"育302", (3, 5)),
+                        course(u"南101", (1, 3)),
+                        course(u"", (3, 1))]
+        self.occupancy = catalog.RoomOccupancy()
+        self.assertEqual(self.occupancy.update(self.courses), 3)
+
+    def test_free_rooms(self):
+        self.assertEqual(len(self.occupancy), 3)
+        self.assertEqual(self.occupancy.free_rooms(3, 3, 5), [u"南101"])
+        self.assertEqual(self.occupancy.free_rooms(3, 5, 5),
+                         [u"南101", u"資201"])
+        self.assertEqual(self.occupancy.free_rooms(1, 1, 2),
+                         [u"南101", u"育302", u"資201"])
+        self.assertEqual(self.occupancy.free_rooms(7, 1, 16),
+                         [u"南101", u"育302", u"資201"])
+
+    def test_update_changed_rooms(self):
+        courses = self.courses + [course(u"資201", (3, 5))]
+        self.assertEqual(self.occupancy.update(courses), 1)
+        self.assertEqual(self.occupancy.free_rooms(3, 5, 5), [u"南101"])
+
+        # Same catalog again change nothing
+        self.assertEqual(self.occupancy.update(courses), 0)
+
+    def test_room_removed(self):
+        self.assertEqual(self.occupancy.update(self.courses[1:]), 1)
+
+        # Not in catalog anymore, don't know if it's free
+        self.assertEqual(len(self.occupancy), 2)
+        self.assertEqual(self.occupancy.free_rooms(1, 1, 2),
+                         [u"南101", u"育302"])
+
+    def test_new_room(self):
+        courses = self.courses + [course(u"中正館", (3, 1)),
+                                  course(u"資201", (2, 1))]
+        self.assertEqual(self.occupancy.update(courses), 2)
+
+        self.assertEqual(self.occupancy.free_rooms(3, 1, 1),
+                         [u"南101", u"育302", u"資201"])
+        self.assertEqual(self.occupancy.free_rooms(2, 1, 1),
+                         [u"中正館", u"南101", u"育302"])
+        self.assertEqual(self.occupancy.free_rooms(3, 3, 5),
+                         [u"中正館", u"南101"])
+
+    def test_slot_out_of_range(self):
+        self.occupancy.update(self.courses + [course(u"資201", (8, 1),
+                                                     (1, 17))])
+        self.assertEqual(self.occupancy.free_rooms(1, 1, 16),
+                         [u"育302", u"資201"])
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import datetime
+import unittest
+
+import kuas_api.kuas.ical as ical
+
+
+def course(title, weekday, start_time, end_time, room=u"育302",
+           instructors=(u"蕭淳元",)):
+    return {"title": title, "instructors": list(instructors),
+            "location": {"building": "", "room": room},
+            "date": {"weekday": weekday, "start_time": start_time,
+                     "end_time": end_time, "section": u""}}
+
+
+class SemesterDatesTest(unittest.TestCase):
+    def test_semester_dates(self):
+        self.assertEqual(ical.semester_dates(106, 1), (
+            datetime.date(2017, 9, 1), datetime.date(2018, 1, 20)))
+        self.assertEqual(ical.semester_dates("106", "2"), (
+            datetime.date(2018, 2, 15), datetime.date(2018, 6, 30)))
+        self.assertEqual(ical.semester_dates(106, 3), (
+            datetime.date(2018, 7, 1), datetime.date(2018, 8, 31)))
+
+
+class MergeSectionsTest(unittest.TestCase):
+    def test_consecutive_sections(self):
+        classes = [course(u"資料結構", "R", "08:10", "09:00"),
+                   course(u"資料結構", "R", "09:10", "10:00"),
+                   course(u"資料結構", "R", "10:10", "11:00")]
+
+        self.assertEqual(ical.merge_sections(classes), [
+            ("R", "08:10", "11:00", classes[0])])
+
+    def test_not_merged(self):
+        classes = [course(u"資料結構", "R", "08:10", "09:00"),
+                   # Gap more than MERGE_GAP
+                   course(u"資料結構", "R", "10:10", "11:00"),
+                   # Other room
+                   course(u"資料結構", "R", "11:10", "12:00", room=u"資201"),
+                   # Other weekday
+                   course(u"資料結構", "F", "12:10", "13:00", room=u"資201")]
+
+        self.assertEqual(
+            [(e[0], e[1], e[2]) for e in ical.merge_sections(classes)],
+            [("R", "08:10", "09:00"), ("R", "10:10", "11:00"),
+             ("R", "11:10", "12:00"), ("F", "12:10", "13:00")])
+
+    def test_interleaved_weekdays(self):
+        # Course table is ordered by section, weekdays are interleaved
+        classes = [course(u"資料結構", "M", "08:10", "09:00"),
+                   course(u"計算機概論", "T", "08:10", "09:00"),
+                   course(u"資料結構", "M", "09:10", "10:00"),
+                   course(u"計算機概論", "T", "09:10", "10:00")]
+
+        self.assertEqual(
+            [(e[0], e[1], e[2]) for e in ical.merge_sections(classes)],
+            [("M", "08:10", "10:00"), ("T", "08:10", "10:00")])
+
+    def test_no_time(self):
+        classes = [{"timecode": []},
+                   course(u"專題", "M", "", ""),
+                   course(u"資料結構", "R", "08:10", "09:00")]
+
+        self.assertEqual(len(ical.merge_sections(classes)), 1)
+
+
+class FoldTest(unittest.TestCase):
+    def test_short_line(self):
+        self.assertEqual(ical._fold(u"SUMMARY:資料結構"),
+                         u"SUMMARY:資料結構".encode("utf-8"))
+        self.assertEqual(ical._fold("X" * 75), b"X" * 75)
+
+    def test_long_line(self):
+        lines = ical._fold("X" * 200).split(b"\r\n")
+
+        self.assertEqual([len(line) for line in lines], [75, 75, 52])
+        self.assertTrue(all(line.startswith(b" ") for line in lines[1:]))
+
+    def test_multibyte(self):
+        line = u"DESCRIPTION:" + u"蕭淳元、" * 30
+        lines = ical._fold(line).split(b"\r\n")
+
+        self.assertTrue(all(len(l) <= 75 for l in lines))
+        # Never split inside a character
+        for l in lines:
+            l.decode("utf-8")
+        self.assertEqual(
+            b"".join([lines[0]] + [l[1:] for l in lines[1:]]).decode("utf-8"),
+            line)
+
+
+class CoursetableIcalTest(unittest.TestCase):
+    def setUp(self):
+        self.first_date, self.last_date = ical.semester_dates(106, 1)
+        self.classes = [course(u"資料結構", "R", "08:10", "09:00"),
+                        course(u"資料結構", "R", "09:10", "10:00"),
+                        course(u"通識, 歷史", "F", "13:30", "15:20",
+                               room=u"", instructors=())]
+
+    def render(self, classes=None, last_date=None):
+        return ical.coursetable_ical(
+            self.classes if classes is None else classes,
+            self.first_date, last_date or self.last_date).decode("utf-8")
+
+    def test_coursetable_ical(self):
+        body = self.render()
+
+        self.assertTrue(body.startswith(u"BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(body.endswith(u"END:VCALENDAR\r\n"))
+        self.assertEqual(body.count(u"BEGIN:VEVENT"), 2)
+
+        # 2017/9/1 is Friday, first Thursday class is 9/7
+        self.assertIn(u"DTSTART;TZID=Asia/Taipei:20170907T081000\r\n", body)
+        self.assertIn(u"DTEND;TZID=Asia/Taipei:20170907T100000\r\n", body)
+        self.assertIn(u"DTSTART;TZID=Asia/Taipei:20170901T133000\r\n", body)
+        # Last moment of 2018/1/20 in Taipei
+        self.assertIn(u"RRULE:FREQ=WEEKLY;UNTIL=20180120T155959Z\r\n", body)
+        self.assertIn(u"LOCATION:育302\r\n", body)
+        self.assertIn(u"DESCRIPTION:蕭淳元\r\n", body)
+
+    def test_escape(self):
+        body = self.render()
+
+        self.assertIn(u"SUMMARY:通識\\, 歷史\r\n", body)
+        # No room, no instructors
+        event = body.split(u"BEGIN:VEVENT")[2]
+        self.assertNotIn(u"LOCATION", event)
+        self.assertNotIn(u"DESCRIPTION", event)
+
+    def test_stable_output(self):
+        # Same course table, same body and so same ETag
+        self.assertEqual(self.render(), self.render())
+        self.assertEqual(self.render().count(u"UID:"), 2)
+        self.assertEqual(len(set(
+            l for l in self.render().split(u"\r\n")
+            if l.startswith(u"UID:"))), 2)
+
+    def test_class_after_last_date(self):
+        body = self.render(last_date=datetime.date(2017, 9, 2))
+
+        self.assertEqual(body.count(u"BEGIN:VEVENT"), 1)
+        self.assertNotIn(u"資料結構", body)
+
+    def test_empty(self):
+        body = self.render(classes=[])
+
+        self.assertNotIn(u"BEGIN:VEVENT", body)
+        self.assertIn(u"BEGIN:VTIMEZONE\r\n", body)
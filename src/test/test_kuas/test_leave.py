@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+from lxml import etree
+
+import kuas_api.kuas.leave as leave
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def read_data(name):
+    # Keep \r\n, delta lengths count them
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8",
+              newline="") as f:
+        return f.read()
+
+
+class ParseLeaveListTest(unittest.TestCase):
+    def setUp(self):
+        self.root = etree.HTML(read_data("leave_list.html"))
+
+    def test_parse_leave_list(self):
+        leaves = leave.parse_leave_list(self.root)
+
+        self.assertEqual(leaves[0], {
+            "leave_sheet_id": "1070001",
+            "date": "107/09/25",
+            "instructors_comment": u"導師准",
+            "leave_sections": [
+                {"section": u"第1節", "reason": u"事"},
+                {"section": u"第2節", "reason": u"事"}]})
+
+    def test_multiple_comments(self):
+        leaves = leave.parse_leave_list(self.root)
+
+        self.assertEqual(leaves[1]["instructors_comment"],
+                         u"導師准 , 系主任准")
+        self.assertEqual(leaves[1]["leave_sections"], [
+            {"section": u"第6節", "reason": u"病"},
+            {"section": u"第7節", "reason": u"病"}])
+
+    def test_no_comment(self):
+        leaves = leave.parse_leave_list(self.root)
+
+        self.assertEqual(leaves[2]["instructors_comment"], "")
+        self.assertEqual(leaves[2]["leave_sections"], [
+            {"section": u"第M節", "reason": u"公"}])
+
+    def test_empty_table(self):
+        root = etree.HTML(u"<html><body><table></table></body></html>")
+        self.assertEqual(leave.parse_leave_list(root), [])
+
+
+class ParseDeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.delta = read_data("leave_delta.txt")
+
+    def test_parse_delta(self):
+        self.assertEqual(leave.parse_delta(self.delta), {
+            "__EVENTTARGET": "",
+            "__EVENTARGUMENT": "",
+            # Value contains "|", only length tell where it ends
+            "__VIEWSTATE": "/wEPDwUKMTY0NzE5NzY2Nw9kFgJmD2QWAgIDD2QWAgIB|Zw==",
+            "__VIEWSTATEGENERATOR": "E0B2E8D1",
+            "__EVENTVALIDATION": "/wEdAAPtZ4nOLAH7ocZEqsyzl3nB"})
+
+    def test_not_delta(self):
+        self.assertIsNone(leave.parse_delta(read_data("leave_list.html")))
+
+    def test_hidden_fields(self):
+        self.assertEqual(leave._hidden_fields(self.delta)["__VIEWSTATE"],
+                         "/wEPDwUKMTY0NzE5NzY2Nw9kFgJmD2QWAgIDD2QWAgIB|Zw==")
+
+        # Full page when server didn't answer a delta
+        self.assertEqual(
+            leave._hidden_fields(read_data("leave_list.html")),
+            {"__VIEWSTATE": "/wEPDwUKLTk4"})
+
+    def test_empty_value(self):
+        delta = (u"12|updatePanel|UpdatePanel1|<div>|</div>|"
+                 u"4|hiddenField|__VIEWSTATE|a|bc|"
+                 u"0|hiddenField|__EVENTTARGET||")
+        self.assertEqual(leave.parse_delta(delta), {
+            "__VIEWSTATE": u"a|bc", "__EVENTTARGET": u""})
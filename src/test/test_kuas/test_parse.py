@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import kuas_api.kuas.parse as parse
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def read_data(name):
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class CourseCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.content = read_data("ag202.html")
+
+    def test_course_catalog(self):
+        courses = parse.course_catalog(self.content)
+
+        self.assertEqual([c["id"] for c in courses], ["1052", "1053", "2101"])
+        self.assertEqual(courses[0], {
+            "id": "1052", "title": u"資料結構", "department": u"四資工二甲",
+            "instructors": [u"蕭淳元"], "units": "3.0", "required": u"必修",
+            "room": u"資201"})
+        self.assertEqual(courses[1]["instructors"], [u"王大明", u"李小華"])
+        self.assertEqual(courses[1]["room"], u"資 305")
+        self.assertEqual(courses[2]["instructors"], [u"張道行", u"陳忠信"])
+        self.assertEqual(courses[2]["room"], "")
+
+    def test_course_catalog_column_order(self):
+        # Columns are found by header text, not position
+        content = self.content.replace(
+            u"<td>開課班級</td>\n    <td>科目名稱</td>",
+            u"<td>科目名稱</td>\n    <td>開課班級</td>")
+        courses = parse.course_catalog(content)
+
+        self.assertEqual(courses[0]["title"], u"四資工二甲")
+        self.assertEqual(courses[0]["department"], u"資料結構")
+
+    def test_course_catalog_empty(self):
+        self.assertEqual(parse.course_catalog(""), [])
+        self.assertEqual(parse.course_catalog(
+            u"<html><body>查無資料</body></html>"), [])
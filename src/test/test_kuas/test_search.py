@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import kuas_api.kuas.search as search
+
+
+def item(n, title, department=u"學務處"):
+    return {"link": "http://www.kuas.edu.tw/%d" % n,
+            "info": {"id": n, "title": title, "department": department,
+                     "date": "2018-01-01"}}
+
+
+def links(results):
+    return [doc["link"] for doc in results]
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_cjk_bigrams(self):
+        self.assertEqual(search.tokenize(u"獎學金"), [u"獎學", u"學金"])
+        self.assertEqual(search.tokenize(u"獎學金", unigrams=True),
+                         [u"獎學", u"學金", u"獎", u"學", u"金"])
+
+    def test_one_character(self):
+        self.assertEqual(search.tokenize(u"獎"), [u"獎"])
+        self.assertEqual(search.tokenize(u"獎", unigrams=True), [u"獎"])
+
+    def test_mixed_text(self):
+        self.assertEqual(
+            search.tokenize(u"KUAS獎學金, Exchange 2018!"),
+            [u"kuas", u"獎學", u"學金", u"exchange", u"2018"])
+
+    def test_no_token(self):
+        self.assertEqual(search.tokenize(u" ,。! "), [])
+
+
+class NotificationIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = search.NotificationIndex()
+        self.index.add(item(0, u"獎學金申請公告"))
+        self.index.add(item(1, u"Exchange student 講座"))
+        self.index.add(item(2, u"颱風停課", department=u"國際事務處"))
+
+    def test_one_character_query(self):
+        self.assertEqual(links(self.index.search(u"金")),
+                         ["http://www.kuas.edu.tw/0"])
+        self.assertEqual(links(self.index.search(u"講")),
+                         ["http://www.kuas.edu.tw/1"])
+
+    def test_mixed_query(self):
+        self.assertEqual(links(self.index.search(u"exchange講座")),
+                         ["http://www.kuas.edu.tw/1"])
+        # All tokens must match
+        self.assertEqual(self.index.search(u"exchange 獎學金"), [])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search(u"圖書館"), [])
+        self.assertEqual(self.index.search(u"  "), [])
+
+    def test_unchanged(self):
+        self.assertFalse(self.index.add(item(0, u"獎學金申請公告")))
+        # id is position in store, move doesn't change notification
+        moved = item(0, u"獎學金申請公告")
+        moved["info"]["id"] = 5
+        self.assertTrue(self.index.is_indexed(moved))
+        self.assertFalse(self.index.add(moved))
+
+    def test_reindex(self):
+        edited = item(0, u"研討會公告")
+        self.assertFalse(self.index.is_indexed(edited))
+        self.assertTrue(self.index.add(edited))
+
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.search(u"獎學金"), [])
+        self.assertNotIn(u"獎學", self.index.postings)
+        self.assertEqual(links(self.index.search(u"研討會")),
+                         ["http://www.kuas.edu.tw/0"])
+        # Token still in new title keep one posting
+        self.assertEqual(self.index.postings[u"公告"], {0: 2})
+
+    def test_ranking(self):
+        self.index.add(item(3, u"停課公告", department=u"颱風中心"))
+        self.index.add(item(4, u"颱風颱風假停課"))
+
+        # Title weight more than department, repeated token more than once
+        self.assertEqual(links(self.index.search(u"颱風")), [
+            "http://www.kuas.edu.tw/4",
+            "http://www.kuas.edu.tw/2",
+            "http://www.kuas.edu.tw/3"])
+        self.assertEqual(links(self.index.search(u"颱風", limit=1)),
+                         ["http://www.kuas.edu.tw/4"])
+
+    def test_rare_token_rank(self):
+        self.index.add(item(3, u"講座公告公告"))
+        self.index.add(item(4, u"講座講座公告"))
+        self.index.add(item(5, u"停車公告"))
+
+        # "公告" is in more notifications, so "講座" count more
+        self.assertEqual(links(self.index.search(u"講座公告")), [
+            "http://www.kuas.edu.tw/4",
+            "http://www.kuas.edu.tw/3"])
@@ -0,0 +1,28 @@
+import os
+import sys
+import unittest
+import subprocess
+
+#: Seconds allowed for importing web-server:app
+IMPORT_TIME_BUDGET = 3.0
+
+IMPORT_SCRIPT = """
+import time
+import importlib
+start = time.time()
+importlib.import_module("web-server").app
+print(time.time() - start)
+"""
+
+
+class ImportTest(unittest.TestCase):
+    def test_import_without_redis(self):
+        # Nothing should connect to redis at import time,
+        # so an unreachable redis must not break or slow down import.
+        env = dict(os.environ, REDIS_URL="redis://127.0.0.1:1/0")
+
+        output = subprocess.check_output(
+            [sys.executable, "-c", IMPORT_SCRIPT], env=env)
+
+        self.assertLess(float(output.decode("utf-8").split()[-1]),
+                        IMPORT_TIME_BUDGET)
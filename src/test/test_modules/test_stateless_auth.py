@@ -0,0 +1,162 @@
+import time
+import uuid
+import unittest
+from unittest import mock
+
+import redis
+from werkzeug.exceptions import HTTPException
+
+import kuas_api
+import kuas_api.kuas.cache as cache
+import kuas_api.modules.const as const
+import kuas_api.modules.credential as credential
+import kuas_api.modules.rate_limit as rate_limit
+import kuas_api.modules.stateless_auth as stateless_auth
+from kuas_api.modules.redis_pool import red
+
+#: Address of test client, TEST-NET-1
+CLIENT_IP = "192.0.2.1"
+
+
+class StatelessAuthTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Need a redis from REDIS_URL, like the server does
+        try:
+            red.ping()
+        except (KeyError, redis.ConnectionError):
+            raise unittest.SkipTest("redis is not available")
+
+    def setUp(self):
+        self.username = "test%s" % uuid.uuid4().hex[:8]
+        self.cookies = {"is_login": {"ap": True}, "cookies": []}
+
+    def tearDown(self):
+        keys = [self.username,
+                stateless_auth.GENERATION_TAG + self.username,
+                rate_limit.RATE_LIMIT_TAG + "login:user:" + self.username,
+                rate_limit.RATE_LIMIT_TAG + "login:ip:" + CLIENT_IP]
+        keys += red.keys(stateless_auth.FAILED_LOGIN_TAG + "*")
+        red.delete(*keys)
+
+    def generate_token(self):
+        return stateless_auth.generate_auth_token(
+            self.username, self.cookies, expiration=600).decode("utf-8")
+
+    def test_token(self):
+        token = self.generate_token()
+
+        username, expires, _ = stateless_auth.check_token(token)
+        self.assertEqual(username, self.username)
+        self.assertGreater(expires, time.time())
+        self.assertEqual(stateless_auth.verify_auth_token(token),
+                         self.username)
+
+    def test_cookies_expire(self):
+        generation_key = stateless_auth.GENERATION_TAG + self.username
+
+        # Not renewable, die with school session
+        with mock.patch.object(credential, "enabled", return_value=False):
+            stateless_auth.generate_auth_token(
+                self.username, self.cookies, expiration=3600)
+        self.assertLessEqual(red.ttl(self.username), cache.SESSION_EXPIRE_AGE)
+        self.assertLessEqual(red.ttl(generation_key),
+                             cache.SESSION_EXPIRE_AGE)
+
+        # Renewed in background, live with token
+        self.cookies["credential"] = "encrypted"
+        with mock.patch.object(credential, "enabled", return_value=True):
+            stateless_auth.generate_auth_token(
+                self.username, self.cookies, expiration=3600)
+        self.assertGreater(red.ttl(self.username), cache.SESSION_EXPIRE_AGE)
+        self.assertGreater(red.ttl(generation_key), cache.SESSION_EXPIRE_AGE)
+
+    def test_tampered_signature(self):
+        token = self.generate_token()
+        payload, signature = token.rsplit(".", 1)
+        tampered = payload + "." + signature[::-1]
+
+        self.assertIsNone(stateless_auth.check_token(tampered))
+        self.assertIsNone(stateless_auth.verify_auth_token(tampered))
+
+        # Signature of another user
+        other = payload.replace(self.username, "x" + self.username[1:])
+        self.assertIsNone(stateless_auth.verify_auth_token(
+            other + "." + signature))
+
+    def test_expired_token(self):
+        self.generate_token()
+        generation = red.get(stateless_auth.GENERATION_TAG + self.username)
+
+        payload = ("%s%s.%d.%s" % (
+            stateless_auth.TOKEN_PREFIX, self.username,
+            time.time() - 1, generation.decode("utf-8"))).encode("utf-8")
+        token = (payload + b"." + stateless_auth._sign(payload)).decode(
+            "utf-8")
+
+        with self.assertRaises(HTTPException) as cm:
+            stateless_auth.verify_auth_token(token)
+        self.assertEqual(cm.exception.code, 401)
+
+    def test_generation_bump(self):
+        old_token = self.generate_token()
+        # Login again while cookies alive keep the generation
+        self.assertEqual(stateless_auth.verify_auth_token(
+            self.generate_token()), self.username)
+        self.assertEqual(stateless_auth.verify_auth_token(old_token),
+                         self.username)
+
+        # Cookies expired, next login start a new generation
+        red.delete(self.username,
+                   stateless_auth.GENERATION_TAG + self.username)
+        time.sleep(0.002)
+        new_token = self.generate_token()
+
+        self.assertIsNone(stateless_auth.verify_auth_token(old_token))
+        self.assertEqual(stateless_auth.verify_auth_token(new_token),
+                         self.username)
+
+    def test_legacy_token(self):
+        red.set(self.username, "{}", ex=600)
+        token = stateless_auth.Serializer(
+            stateless_auth.DIRTY_SECRET_KEY, expires_in=600).dumps(
+                {"sid": self.username}).decode("ascii")
+
+        with mock.patch.object(const, "legacy_token_accept", True):
+            self.assertEqual(stateless_auth.verify_auth_token(token),
+                             self.username)
+
+        with mock.patch.object(const, "legacy_token_accept", False):
+            self.assertIsNone(stateless_auth.verify_auth_token(token))
+
+    def test_failed_login_rate_limit(self):
+        capacity = stateless_auth.LOGIN_USER_BUCKET[0]
+
+        def verify(password):
+            with kuas_api.app.test_request_context(
+                    environ_base={"REMOTE_ADDR": CLIENT_IP}):
+                return stateless_auth.verify_password(self.username, password)
+
+        with mock.patch.object(cache, "login",
+                               return_value=False) as login:
+            for n in range(capacity):
+                self.assertFalse(verify("wrong%d" % n))
+
+            # Same wrong password again is answered by negative cache
+            self.assertFalse(verify("wrong0"))
+            self.assertEqual(login.call_count, capacity)
+
+            with self.assertRaises(HTTPException) as cm:
+                verify("wrong%d" % capacity)
+            self.assertEqual(cm.exception.get_response().status_code, 429)
+            self.assertEqual(login.call_count, capacity)
+
+    def test_successful_login_not_limited(self):
+        capacity = stateless_auth.LOGIN_USER_BUCKET[0]
+
+        with mock.patch.object(cache, "login", return_value=self.cookies):
+            for _ in range(capacity + 2):
+                with kuas_api.app.test_request_context(
+                        environ_base={"REMOTE_ADDR": CLIENT_IP}):
+                    self.assertTrue(stateless_auth.verify_password(
+                        self.username, "password"))